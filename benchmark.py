@@ -0,0 +1,306 @@
+"""
+性能基准：用合成数据在无浏览器、无网络的环境下测量数据处理和看板渲染的热点路径。
+
+每个阶段单独计时 (多次运行取最小值和中位数)，另外单独运行一次用 tracemalloc 记录 Python 侧的峰值内存。
+结果连同当前 git 提交号追加写入 BENCHMARK_RESULTS_FILE，可以和以前的提交对比。
+用法：
+    python benchmark.py                          # 默认规模：5 年 × 40 个地区
+    python benchmark.py --years 20 --regions 300 --repeat 5
+    python benchmark.py --compare                # 与同规模的上一条结果对比
+    python benchmark.py --imports-only           # 只检查看板的导入耗时预算，超出预算时以状态码 1 退出
+"""
+import os
+import csv
+import json
+import time
+import shutil
+import argparse
+import itertools
+import tempfile
+import statistics
+import subprocess
+import sys
+import tracemalloc
+from datetime import datetime
+import numpy as np
+import data_store
+import chart_data
+
+# --- 配置区 ---
+BENCHMARK_RESULTS_FILE = "benchmark_results.jsonl"
+DEFAULT_YEARS = 5
+DEFAULT_REGIONS = 40
+DEFAULT_REPEAT = 3
+LAST_YEAR = 2025
+WORKBOOK_MAX_REGIONS = 40  # 工作簿导入导出很慢，超过这个地区数时只取前面这些地区
+CHART_COLUMNS = ('进出口_当月', '进口_当月', '出口_当月')
+RAW_PATH = "raw_csv_data"
+WORKBOOK_FILENAME = "benchmark.xlsx"
+# 看板冷启动时导入的模块 (streamlit_echarts 只能在 Streamlit 运行时中导入，且已改为画图时才导入，不在此列)
+DASHBOARD_IMPORTS = ("streamlit", "data_store", "dashboard_views", "region_catalog", "perf_trace", "refresh_worker")
+# 只读访问不应该加载的重量级依赖：抓取 (Playwright、静态HTTP抓取) 和图表构造
+DEFERRED_MODULES = ("playwright", "pyecharts", "streamlit_echarts", "crawler", "http_fetcher", "lxml")
+IMPORT_BUDGET_SECONDS = 1.5
+
+# =============================================================================
+#  合成数据：与海关网站下载的原始CSV结构相同 (单位行、指标行、口径行三行表头)
+# =============================================================================
+def synthetic_regions(n_regions):
+    return ['全国'] + [f"地区{i:04d}" for i in range(1, n_regions)]
+
+def write_raw_csvs(raw_path, years, regions, seed=0):
+    """生成 years 年 × 12 个月的原始CSV，返回写入的文件数。各地区的量级和季节波动随机但可复现。"""
+    os.makedirs(raw_path, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    n = len(regions)
+    scale = rng.uniform(1e4, 1e6, size=(2, n))
+    scale[:, 0] = scale[:, 1:].sum(axis=1) if n > 1 else scale[:, 0]  # 全国约等于各地区之和
+    cumulative = np.zeros((2, n))
+    count = 0
+    for year in range(LAST_YEAR - years + 1, LAST_YEAR + 1):
+        cumulative[:] = 0
+        for month in range(1, 13):
+            current = scale * rng.uniform(0.8, 1.2, size=(2, n)) * (1 + 0.1 * np.sin(month / 12 * 2 * np.pi))
+            cumulative += current
+            exports, imports = current.round()
+            exports_ytd, imports_ytd = cumulative.round()
+            path = os.path.join(raw_path, f"{year}-{month:02d}.csv")
+            with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['单位：万元'] * 10)
+                writer.writerow(['收发货人所在地', '进出口', '进出口', '出口', '出口', '进口', '进口',
+                                 '累计比去年同期±%', '累计比去年同期±%', '累计比去年同期±%'])
+                writer.writerow(['收发货人所在地', '当月', f'1至{month}月', '当月', f'1至{month}月',
+                                 '当月', f'1至{month}月', '进出口', '出口', '进口'])
+                for i, region in enumerate(regions):
+                    writer.writerow([region, f"{exports[i] + imports[i]:.0f}", f"{exports_ytd[i] + imports_ytd[i]:.0f}",
+                                     f"{exports[i]:.0f}", f"{exports_ytd[i]:.0f}", f"{imports[i]:.0f}",
+                                     f"{imports_ytd[i]:.0f}", '1.2', '3.4', '-0.5'])
+            count += 1
+    return count
+
+def revise_last_month(raw_path, regions, seed):
+    """把最后一个月的文件换一组随机数重写，模拟海关修订数据，用来测增量处理。每次传入不同的 seed。"""
+    with tempfile.TemporaryDirectory() as tmp:
+        write_raw_csvs(tmp, 1, regions, seed=seed)
+        shutil.copy(os.path.join(tmp, f"{LAST_YEAR}-12.csv"), os.path.join(raw_path, f"{LAST_YEAR}-12.csv"))
+
+# =============================================================================
+#  被测阶段：与看板和后台刷新程序走同一套 data_store 函数
+# =============================================================================
+def reset_processed():
+    for path in (data_store.PROCESSED_PATH, data_store.STORE_PATH):
+        shutil.rmtree(path, ignore_errors=True)
+    data_store.open_shared_arrow.cache_clear()
+
+def process_all(raw_path):
+    """全量处理并发布：解析全部原始CSV、计算派生指标、写入版本化存储 (refresh_worker.process_raw_data 去掉Excel导出)。"""
+    metrics, changed_months, errors = data_store.refresh_processed_store(raw_path)
+    if errors:
+        raise RuntimeError(f"处理合成数据出错: {errors[:3]}")
+    return data_store.write_store(data_store.build_region_frames(metrics))
+
+def load_all(version):
+    data_store.open_shared_arrow.cache_clear()
+    return data_store.load_regions(version=version)
+
+def format_tables(frames):
+    """看板里逐个单元格发生的格式化：横轴月份标签，以及最新月份卡片的数值和同比。"""
+    for df in frames.values():
+        data_store.format_month(df['时间'])
+        latest = df.iloc[-1]
+        for col in df.columns.drop('时间'):
+            if data_store.is_ratio_column(col):
+                data_store.format_delta(latest[col])
+            else:
+                data_store.format_value(latest[col])
+
+def build_chart_options(frames):
+    """为每个地区构造与看板相同的当月走势折线图，并序列化成 st_echarts 的配置字典。"""
+    from pyecharts import options as opts
+    from pyecharts.charts import Line
+    for df in frames.values():
+        labels = data_store.format_month(df['时间']).tolist()
+        x_data, y_data = chart_data.decimate(labels, {col: df[col].to_numpy() for col in CHART_COLUMNS})
+        chart = Line().add_xaxis(xaxis_data=x_data)
+        for col in CHART_COLUMNS:
+            chart.add_yaxis(series_name=col.split('_')[0], y_axis=y_data[col],
+                            label_opts=opts.LabelOpts(is_show=False))
+        chart.set_global_opts(tooltip_opts=opts.TooltipOpts(trigger="axis"))
+        json.loads(chart.dump_options())
+
+# =============================================================================
+#  看板的导入耗时：每次在全新的解释器里导入，才能测到冷启动的真实开销
+# =============================================================================
+IMPORT_PROBE = """
+import sys, json, time
+started = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+seconds = time.perf_counter() - started
+print(json.dumps({{'seconds': seconds, 'loaded': [m for m in {deferred!r} if m in sys.modules]}}))
+"""
+
+def measure_dashboard_imports(repeat):
+    """在 repeat 个新解释器里分别导入 DASHBOARD_IMPORTS，返回耗时和被提前加载的 DEFERRED_MODULES。"""
+    code = IMPORT_PROBE.format(modules=DASHBOARD_IMPORTS, deferred=DEFERRED_MODULES)
+    timings, loaded = [], set()
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        probe = json.loads(result.stdout.strip().splitlines()[-1])
+        timings.append(probe['seconds'])
+        loaded.update(probe['loaded'])
+    return {'min_seconds': min(timings), 'median_seconds': statistics.median(timings), 'peak_mb': None,
+            'rows': None, 'rows_per_second': None, 'deferred_loaded': sorted(loaded)}
+
+def check_import_budget(result, budget=IMPORT_BUDGET_SECONDS):
+    """返回违反预算的说明列表，为空表示通过。"""
+    problems = []
+    if result['min_seconds'] > budget:
+        problems.append(f"看板导入耗时 {result['min_seconds']:.2f} 秒，超出预算 {budget:.2f} 秒")
+    if result['deferred_loaded']:
+        problems.append("只读看板导入时加载了应当延迟导入的模块: " + ", ".join(result['deferred_loaded']))
+    return problems
+
+# =============================================================================
+#  计时与峰值内存
+# =============================================================================
+def measure(func, repeat, setup=None):
+    """
+    先运行 repeat 次计时 (每次之前调用 setup)，再单独运行一次用 tracemalloc 记录峰值内存。
+    tracemalloc 只统计本进程由 Python 分配的内存 (包括 numpy 数组，不包括 pyarrow 的内存池和解析子进程)。
+    """
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'min_seconds': min(timings), 'median_seconds': statistics.median(timings), 'peak_mb': peak / 2 ** 20}
+
+def run_benchmarks(years, n_regions, repeat, log=print):
+    """在临时目录中生成数据并依次测量各阶段，返回 {阶段名: 结果}。每个结果附带处理的行数 (地区 × 月份) 和吞吐量。"""
+    regions = synthetic_regions(n_regions)
+    rows = years * 12 * n_regions
+    results = {}
+    cwd = os.getcwd()
+    log("测量 dashboard_imports ...")
+    results['dashboard_imports'] = measure_dashboard_imports(repeat)
+    with tempfile.TemporaryDirectory(prefix="customs_bench_") as workdir:
+        os.chdir(workdir)  # data_store 的存储路径都是相对路径
+        try:
+            log(f"生成合成数据：{years} 年 × {n_regions} 个地区 ...")
+            write_raw_csvs(RAW_PATH, years, regions)
+
+            def record(name, func, setup=None, n_rows=rows):
+                log(f"测量 {name} ...")
+                result = measure(func, repeat, setup)
+                result['rows'] = n_rows
+                result['rows_per_second'] = n_rows / result['min_seconds'] if result['min_seconds'] else None
+                results[name] = result
+
+            record('process_full', lambda: process_all(RAW_PATH), setup=reset_processed)
+            reset_processed()
+            process_all(RAW_PATH)
+            seeds = itertools.count(1)
+            record('process_incremental', lambda: process_all(RAW_PATH),
+                   setup=lambda: revise_last_month(RAW_PATH, regions, next(seeds)), n_rows=n_regions)
+
+            version = data_store.read_version()
+            frames = load_all(version)
+            record('load_data', lambda: load_all(version))
+            record('latest_snapshot', lambda: data_store.build_latest_snapshot(frames), n_rows=n_regions)
+            record('format_tables', lambda: format_tables(frames))
+            record('chart_options', lambda: build_chart_options(frames))
+
+            workbook_frames = dict(list(frames.items())[:WORKBOOK_MAX_REGIONS])
+            workbook_rows = sum(len(df) for df in workbook_frames.values())
+            record('export_workbook', lambda: data_store.export_excel(workbook_frames, WORKBOOK_FILENAME),
+                   n_rows=workbook_rows)
+            record('import_workbook', lambda: data_store.import_workbook(WORKBOOK_FILENAME), n_rows=workbook_rows)
+        finally:
+            os.chdir(cwd)
+    return results
+
+# =============================================================================
+#  结果存储与对比
+# =============================================================================
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def load_results(path=BENCHMARK_RESULTS_FILE):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except OSError:
+        return []
+
+def save_result(record, path=BENCHMARK_RESULTS_FILE):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+def print_report(record, baseline=None):
+    header = f"{'阶段':<22}{'最短(秒)':>10}{'中位(秒)':>10}{'行/秒':>12}{'峰值(MB)':>10}"
+    if baseline:
+        header += f"{'对比':>10}"
+    print(header)
+    for name, result in record['stages'].items():
+        line = (f"{name:<22}{result['min_seconds']:>10.3f}{result['median_seconds']:>10.3f}"
+                f"{result['rows_per_second'] or 0:>12,.0f}{result['peak_mb'] or 0:>10.1f}")
+        base = baseline['stages'].get(name) if baseline else None
+        if base:
+            line += f"{result['min_seconds'] / base['min_seconds']:>9.2f}x"
+        print(line)
+    if baseline:
+        print(f"对比基准：提交 {baseline.get('commit')}，{baseline.get('timestamp')}")
+
+def main():
+    parser = argparse.ArgumentParser(description="海关数据看板性能基准")
+    parser.add_argument("--years", type=int, default=DEFAULT_YEARS, help="合成数据的年数")
+    parser.add_argument("--regions", type=int, default=DEFAULT_REGIONS, help="合成数据的地区数 (包括全国)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="每个阶段计时的次数")
+    parser.add_argument("--compare", action="store_true", help="与同规模的上一条结果对比")
+    parser.add_argument("--no-save", action="store_true", help="只打印结果，不写入结果文件")
+    parser.add_argument("--imports-only", action="store_true", help="只检查看板的导入耗时预算")
+    parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET_SECONDS, help="看板导入耗时预算 (秒)")
+    args = parser.parse_args()
+
+    if args.imports_only:
+        result = measure_dashboard_imports(args.repeat)
+        print(f"看板导入耗时：最短 {result['min_seconds']:.3f} 秒，中位 {result['median_seconds']:.3f} 秒 "
+              f"(预算 {args.import_budget:.2f} 秒)")
+        problems = check_import_budget(result, args.import_budget)
+        for problem in problems:
+            print(problem)
+        sys.exit(1 if problems else 0)
+
+    results_path = os.path.abspath(BENCHMARK_RESULTS_FILE)
+    stages = run_benchmarks(args.years, args.regions, args.repeat)
+    record = {'timestamp': datetime.now().isoformat(timespec='seconds'), 'commit': git_commit(),
+              'years': args.years, 'regions': args.regions, 'repeat': args.repeat, 'stages': stages}
+    baseline = None
+    if args.compare:
+        same_scale = [r for r in load_results(results_path) if r['years'] == args.years and r['regions'] == args.regions]
+        baseline = same_scale[-1] if same_scale else None
+    print_report(record, baseline)
+    for problem in check_import_budget(stages['dashboard_imports'], args.import_budget):
+        print(problem)
+    if not args.no_save:
+        save_result(record, results_path)
+
+if __name__ == "__main__":
+    main()
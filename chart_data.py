@@ -0,0 +1,77 @@
+import numpy as np
+
+# --- 配置区 ---
+MAX_CHART_POINTS = 240  # 单个图表横轴最多传给浏览器的点数 (20年的月度数据)
+
+# =============================================================================
+#  序列降采样：长序列在服务端先抽稀，再交给 pyecharts 序列化
+# =============================================================================
+def lttb_indices(y, threshold):
+    """
+    Largest-Triangle-Three-Buckets 降采样，返回保留点的下标 (升序)。
+    首尾两点必定保留，中间每个桶选出与前一个已选点、下一个桶均值构成三角形面积最大的点，
+    能在点数大幅减少的同时保留序列的峰谷形状。
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.arange(n, dtype=float)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    sampled = np.empty(threshold, dtype=int)
+    sampled[0] = 0
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        next_y = y[next_start:next_end]
+        avg_x = x[next_start:next_end].mean()
+        avg_y = np.nanmean(next_y) if not np.isnan(next_y).all() else y[a]
+
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        # 缺失值永远不会被选中，除非整个桶都是缺失值
+        a = start + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        sampled[i + 1] = a
+    sampled[-1] = n - 1
+    return sampled
+
+def minmax_indices(y, n_buckets):
+    """最小/最大值分桶降采样：每个桶保留最小值和最大值两个点，适合需要看清极值的场景。"""
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n_buckets * 2 >= n or n_buckets < 1:
+        return np.arange(n)
+    indices = {0, n - 1}
+    for bucket in np.array_split(np.arange(n), n_buckets):
+        values = np.nan_to_num(y[bucket], nan=np.nanmean(y[bucket]) if not np.isnan(y[bucket]).all() else 0.0)
+        indices.add(int(bucket[np.argmin(values)]))
+        indices.add(int(bucket[np.argmax(values)]))
+    return np.array(sorted(indices))
+
+def decimate(x_labels, series_by_name, max_points=MAX_CHART_POINTS, method="lttb"):
+    """
+    对共用一条横轴的多条序列降采样，返回 (横轴标签列表, {序列名: 数值列表})。
+    每条序列分到 max_points / 序列数 的点数预算，各自选出的下标取并集，
+    这样每条序列的峰谷都能保留，总点数也不超过 max_points。点数本来就不多时原样返回。
+    """
+    n = len(x_labels)
+    if n <= max_points or not series_by_name:
+        keep = np.arange(n)
+    else:
+        budget = max(3, max_points // len(series_by_name))
+        keep = set()
+        for values in series_by_name.values():
+            if method == "minmax":
+                keep.update(minmax_indices(values, budget // 2).tolist())
+            else:
+                keep.update(lttb_indices(values, budget).tolist())
+        keep = np.array(sorted(keep))
+
+    x = [x_labels[i] for i in keep]
+    ys = {}
+    for name, values in series_by_name.items():
+        values = np.asarray(values, dtype=float)[keep]
+        # pyecharts 序列化时 NaN 不是合法的 JSON，用 None 表示缺失
+        ys[name] = [None if np.isnan(v) else v.item() for v in values]
+    return x, ys
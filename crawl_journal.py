@@ -0,0 +1,123 @@
+import time
+import sqlite3
+import asyncio
+import threading
+
+# --- 配置区 ---
+JOURNAL_FILE = "crawl_journal.sqlite"
+MAX_ATTEMPTS = 8                   # 累计失败这么多次后不再自动重试，留给人工检查 (reset_failed 可重新放行)
+BACKOFF_BASE_SECONDS = 60          # 跨运行的退避：第 n 次失败后至少等待 BACKOFF_BASE_SECONDS * 2**(n-1) 秒
+BACKOFF_MAX_SECONDS = 6 * 60 * 60
+RETRIES_PER_RUN = 3                # 同一次运行内的重试次数
+RETRY_DELAY_SECONDS = 2.0          # 同一次运行内的重试间隔基数，同样按 2 的幂次增长
+
+PENDING, DONE, FAILED = 'pending', 'done', 'failed'
+
+def backoff_seconds(attempts, base=BACKOFF_BASE_SECONDS, cap=BACKOFF_MAX_SECONDS):
+    return min(cap, base * 2 ** max(0, attempts - 1))
+
+# =============================================================================
+#  任务日志：每个 (年, 月) 下载任务的状态、尝试次数和下次可重试时间
+# =============================================================================
+class CrawlJournal:
+    """
+    用 SQLite 记录抓取任务，中断或部分失败后再次运行只处理未完成的任务。
+    下载线程池和浏览器协程都会调用，所有操作用一把锁串行化。
+    """
+
+    def __init__(self, path=JOURNAL_FILE):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    year INTEGER NOT NULL,
+                    month INTEGER NOT NULL,
+                    url TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    next_attempt_at REAL NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (year, month)
+                )
+            """)
+
+    def _execute(self, sql, params=()):
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params).fetchall()
+
+    def add_tasks(self, tasks):
+        """
+        登记本地缺少的月份 [(年, 月, URL)]。已有的任务保留其尝试次数和退避时间；
+        记录为已完成、但文件又不见了的任务重新变为待处理。
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany("""
+                INSERT INTO tasks (year, month, url, state, updated_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (year, month) DO UPDATE SET
+                    url = excluded.url,
+                    attempts = CASE WHEN state = 'done' THEN 0 ELSE attempts END,
+                    state = CASE WHEN state = 'done' THEN 'pending' ELSE state END,
+                    updated_at = excluded.updated_at
+            """, [(year, month, url, PENDING, now) for year, month, url in tasks])
+
+    def due_tasks(self, now=None):
+        """返回现在可以执行的 [(年, 月, URL)]：待处理的，以及退避时间已过、尚未超过重试上限的失败任务。"""
+        rows = self._execute("""
+            SELECT year, month, url FROM tasks
+            WHERE state IN (?, ?) AND next_attempt_at <= ? AND attempts < ?
+            ORDER BY year, month
+        """, (PENDING, FAILED, now or time.time(), MAX_ATTEMPTS))
+        return [tuple(row) for row in rows]
+
+    def mark_done(self, year, month):
+        self._execute("UPDATE tasks SET state = ?, last_error = NULL, updated_at = ? WHERE year = ? AND month = ?",
+                      (DONE, time.time(), year, month))
+
+    def mark_failed(self, year, month, error):
+        """记录一次失败，按已失败次数计算下次可重试的时间。"""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT attempts FROM tasks WHERE year = ? AND month = ?", (year, month)).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            self._conn.execute("""
+                UPDATE tasks SET state = ?, attempts = ?, last_error = ?, next_attempt_at = ?, updated_at = ?
+                WHERE year = ? AND month = ?
+            """, (FAILED, attempts, str(error)[:500], now + backoff_seconds(attempts), now, year, month))
+
+    def reset_failed(self):
+        """把所有失败任务 (包括超过重试上限的) 恢复为立即可重试。"""
+        self._execute("UPDATE tasks SET state = ?, attempts = 0, next_attempt_at = 0 WHERE state = ?", (PENDING, FAILED))
+
+    def summary(self):
+        return dict(self._execute("SELECT state, COUNT(*) FROM tasks GROUP BY state"))
+
+    def close(self):
+        self._conn.close()
+
+# =============================================================================
+#  同一次运行内的指数退避重试
+# =============================================================================
+def retry_call(func, *args, retries=RETRIES_PER_RUN, delay=RETRY_DELAY_SECONDS, no_retry=()):
+    """调用 func，失败后按 delay, 2*delay, 4*delay... 等待重试；no_retry 中的异常直接抛出。"""
+    for attempt in range(retries + 1):
+        try:
+            return func(*args)
+        except no_retry:
+            raise
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(delay * 2 ** attempt)
+
+async def retry_async(func, *args, retries=RETRIES_PER_RUN, delay=RETRY_DELAY_SECONDS):
+    """retry_call 的协程版本，等待期间不占用事件循环。"""
+    for attempt in range(retries + 1):
+        try:
+            return await func(*args)
+        except Exception:
+            if attempt == retries:
+                raise
+            await asyncio.sleep(delay * 2 ** attempt)
@@ -0,0 +1,229 @@
+import os
+import sys
+import time
+import asyncio
+from io import StringIO
+from datetime import datetime
+from urllib.parse import urljoin, urlparse
+import pandas as pd
+import crawl_journal
+import perf_trace
+
+# --- 配置区 ---
+BASE_URL = "http://www.customs.gov.cn/customs/302249/zfxxgk/2799825/302274/302277/6348926/index.html"
+TABLE_NAME = "进出口商品收发货人所在地总值表"
+TABLE_CONTAINER_SELECTOR = "div.easysite-news-text"
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/99.0.4844.84 Safari/537.36'
+FIRST_YEAR = 2024
+DEFAULT_CONCURRENCY = 3      # 同时打开的浏览器页面数
+DEFAULT_MIN_INTERVAL = 1.0   # 同一主机两次请求之间的最小间隔 (秒)，对海关网站保持礼貌
+
+# =============================================================================
+#  通用工具
+# =============================================================================
+def month_filename(year, month):
+    return f"{year}-{month:02d}.csv"
+
+def parse_month_text(month_text):
+    """'3月' -> 3；不是月份链接时返回 None。"""
+    if "月" not in month_text:
+        return None
+    try:
+        return int(month_text.replace("月", "").strip())
+    except ValueError:
+        return None
+
+def parse_table_html(table_html):
+    """从详情页表格的HTML中解析出 DataFrame，没有表格时返回 None。"""
+    with perf_trace.span("crawl.read_html"):
+        try:
+            # 只用 lxml 解析：默认还会退回到 bs4/html5lib，没有表格时抛出的就变成了缺少依赖的 ImportError
+            dataframes = pd.read_html(StringIO(table_html), header=[0, 1], flavor='lxml')
+        except ValueError:
+            return None
+    return dataframes[0] if dataframes else None
+
+def save_month_table(df, raw_path, year, month):
+    file_path = os.path.join(raw_path, month_filename(year, month))
+    with perf_trace.span("crawl.write_csv"):
+        df.to_csv(file_path, index=False, encoding='utf-8-sig')
+    return file_path
+
+class HostRateLimiter:
+    """按主机名限制请求频率：同一主机的两次请求之间至少间隔 min_interval 秒。"""
+
+    def __init__(self, min_interval=DEFAULT_MIN_INTERVAL):
+        self.min_interval = min_interval
+        self._locks = {}
+        self._last_request = {}
+
+    async def wait(self, url):
+        host = urlparse(url).netloc
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            delay = self._last_request.get(host, 0) + self.min_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._last_request[host] = time.monotonic()
+
+# =============================================================================
+#  异步抓取：有上限的页面池 + 按主机限速 + 事件驱动的等待
+# =============================================================================
+async def collect_month_links(page, limiter, year):
+    """打开索引页并切换到指定年份，返回该年份所有月份的 [(月份, 详情页URL)]。"""
+    await limiter.wait(BASE_URL)
+    with perf_trace.span("crawl.navigate", page="index", year=year):
+        await page.goto(BASE_URL, timeout=60000)
+        await page.wait_for_selector("//div[@class='customs-foot']", timeout=30000)
+
+        year_button = await page.wait_for_selector(f"//a[contains(text(), '{year}')]", timeout=20000)
+        await year_button.click()
+        # 不再固定 sleep，而是等年份切换引起的请求全部完成
+        await page.wait_for_load_state("networkidle", timeout=30000)
+
+    row = await page.wait_for_selector(f"//tr[contains(., '{TABLE_NAME}')]", timeout=20000)
+    month_links = []
+    for link in await row.query_selector_all("a"):
+        href = await link.get_attribute('href')
+        month = parse_month_text(await link.inner_text())
+        if href and month:
+            month_links.append((month, urljoin(page.url, href)))
+    return month_links
+
+async def fetch_month_table(page, limiter, url):
+    """在池中的页面里直接打开详情页，等表格容器出现后解析表格；容器里没有表格时抛出 ValueError。"""
+    await limiter.wait(url)
+    with perf_trace.span("crawl.navigate", page="detail"):
+        await page.goto(url, timeout=60000)
+        await page.wait_for_selector(TABLE_CONTAINER_SELECTOR, timeout=20000)
+    with perf_trace.span("crawl.extract_table"):
+        table_html = await page.locator(TABLE_CONTAINER_SELECTOR).inner_html()
+    df = parse_table_html(table_html)
+    if df is None:
+        # 与 http_fetcher.StaticFetcher.month_table 一致：没有表格算作失败，任务日志里记为失败待重试，不能记为完成
+        raise ValueError(f"{url} 中没有数据表格")
+    return df
+
+async def crawl_new_months(raw_path, existing_files, years, concurrency=DEFAULT_CONCURRENCY,
+                           min_interval=DEFAULT_MIN_INTERVAL, on_progress=None, tasks=(), journal=None):
+    """
+    并发检查各年份并下载本地缺少的月份。
+    concurrency 个独立的浏览器上下文组成页面池，所有请求共享一个按主机限速器。
+    tasks 为已经知道详情页URL的 [(年, 月, URL)]，会和各年份索引中找到的新月份一起下载。
+    传入 journal 时新月份先登记到任务日志，再连同日志中所有到期的任务一起下载，结果写回日志。
+    返回 (新下载的文件列表, [(任务描述, 异常)])。
+    """
+    # Playwright 导入较慢，只在确实需要浏览器时才导入；静态HTTP抓取和看板都不会走到这里
+    from playwright.async_api import async_playwright
+
+    report = on_progress or (lambda message, fraction=None: None)
+    limiter = HostRateLimiter(min_interval)
+    downloaded = []
+    errors = []
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        pages = asyncio.Queue()
+        for _ in range(max(1, concurrency)):
+            context = await browser.new_context(user_agent=USER_AGENT)
+            pages.put_nowait(await context.new_page())
+
+        async def with_page(func, *args):
+            page = await pages.get()
+            try:
+                return await func(page, limiter, *args)
+            finally:
+                pages.put_nowait(page)
+
+        try:
+            # 第一步：并发读取各年份索引，找出本地缺少的月份
+            if years:
+                report("正在检查年份: " + ", ".join(str(year) for year in years))
+            results = await asyncio.gather(*(with_page(collect_month_links, year) for year in years),
+                                           return_exceptions=True)
+            tasks = list(tasks)
+            for year, result in zip(years, results):
+                if isinstance(result, Exception):
+                    errors.append((f"{year} 年索引", result))
+                    continue
+                for month, url in result:
+                    if month_filename(year, month) not in existing_files:
+                        tasks.append((year, month, url))
+            if journal is not None:
+                journal.add_tasks(tasks)
+                tasks = [task for task in journal.due_tasks() if month_filename(task[0], task[1]) not in existing_files]
+
+            if not tasks:
+                report("未发现需要下载的新数据。", 1.0)
+                return downloaded, errors
+
+            # 第二步：详情页在页面池中并发下载，谁先完成谁先保存
+            finished = 0
+
+            async def download(year, month, url):
+                nonlocal finished
+                try:
+                    df = await crawl_journal.retry_async(with_page, fetch_month_table, url)
+                    downloaded.append(save_month_table(df, raw_path, year, month))
+                    if journal is not None:
+                        journal.mark_done(year, month)
+                except Exception as e:
+                    errors.append((f"{year}年{month}月", e))
+                    if journal is not None:
+                        journal.mark_failed(year, month, e)
+                finished += 1
+                report(f"已完成 {finished}/{len(tasks)}: {year}年{month}月", finished / len(tasks))
+
+            await asyncio.gather(*(download(*task) for task in tasks))
+        finally:
+            await browser.close()
+
+    return downloaded, errors
+
+def run_crawl(raw_path, concurrency=DEFAULT_CONCURRENCY, min_interval=DEFAULT_MIN_INTERVAL, on_progress=None,
+              http_first=True):
+    """
+    同步入口，可以在 Streamlit 脚本线程中直接调用。
+    http_first 为 True 时先用静态HTTP抓取，只有被JS拦截的年份/月份才启动浏览器。
+    每个月份的下载状态记录在任务日志 (crawl_journal.JOURNAL_FILE) 里，中断后再次运行只处理未完成的月份。
+    """
+    os.makedirs(raw_path, exist_ok=True)
+    journal = crawl_journal.CrawlJournal()
+    try:
+        return _run_crawl(raw_path, journal, concurrency, min_interval, on_progress, http_first)
+    finally:
+        journal.close()
+
+def _run_crawl(raw_path, journal, concurrency, min_interval, on_progress, http_first):
+    existing_files = set(os.listdir(raw_path))
+    years = list(range(FIRST_YEAR, datetime.now().year + 1))
+
+    downloaded, errors, browser_tasks = [], [], []
+    if http_first:
+        import http_fetcher
+        from http_cache import HttpCache
+        fetcher = http_fetcher.StaticFetcher(pool_size=concurrency, min_interval=min_interval, cache=HttpCache())
+        # 本地已有数据、也没有待重试的任务时先做一次廉价探测，索引和最新年份都没变化就直接结束
+        if existing_files and not journal.due_tasks() and not http_fetcher.probe_for_changes(fetcher, years):
+            fetcher.cache.save()
+            if on_progress:
+                on_progress("网站数据没有变化，无需下载。", 1.0)
+            return downloaded, errors
+        downloaded, errors, years, browser_tasks = http_fetcher.fetch_new_months(
+            fetcher, raw_path, existing_files, years, on_progress, journal
+        )
+        if not years and not browser_tasks:
+            return downloaded, errors
+        if on_progress:
+            on_progress("部分页面需要执行JS，正在启动浏览器处理...")
+
+    # Windows 上只有 Proactor 事件循环支持子进程，Playwright 需要用它启动浏览器
+    loop = asyncio.ProactorEventLoop() if sys.platform == 'win32' else asyncio.new_event_loop()
+    try:
+        browser_downloaded, browser_errors = loop.run_until_complete(
+            crawl_new_months(raw_path, existing_files, years, concurrency, min_interval, on_progress, browser_tasks,
+                             journal)
+        )
+    finally:
+        loop.close()
+    return downloaded + browser_downloaded, errors + browser_errors
@@ -0,0 +1,131 @@
+import json
+import pandas as pd
+import streamlit as st
+import chart_data
+import data_store
+import perf_trace
+
+# --- 配置区 ---
+# 走势图配置的缓存条数：按 (数据版本, 地区, 图表种类, 时间窗口) 缓存，超出后淘汰最久未用的
+CHART_CACHE_ENTRIES = 64
+# 同时保留几个数据版本的地区访问器：当前版本，加上还固定在上一个版本的会话
+DATA_CACHE_VERSIONS = 2
+
+# =============================================================================
+#  会话固定的数据版本：后台发布新版本时，正在看的会话不会在中途换数据
+# =============================================================================
+def pin_data_version(current_version):
+    """
+    返回本会话使用的数据版本。第一次打开页面时固定为当前版本；之后有新版本发布时，
+    在侧边栏提示用户切换，直到用户点击切换 (或者固定的旧版本已被清理) 才换到新版本。
+    """
+    pinned = st.session_state.get('data_version')
+    if pinned is None or not data_store.version_exists(pinned):
+        pinned = st.session_state['data_version'] = current_version
+    elif pinned != current_version:
+        st.sidebar.info("后台已发布新的数据版本。")
+        if st.sidebar.button("切换到最新数据"):
+            st.session_state['data_version'] = current_version
+            st.rerun()
+    return pinned
+
+# =============================================================================
+#  按需加载：各看板的 load_data 返回 data_store.RegionFrames，地区在被选中时才读取，
+#  按占用字节数做 LRU 淘汰。访问器用 st.cache_resource 缓存，同一进程的所有会话共享，
+#  数据框引用 data_store 内存映射的 Arrow 文件，调用方只读不改
+# =============================================================================
+@st.cache_data
+def stored_regions(data_version):
+    """存储中保存的全部地区名称。"""
+    return data_store.list_regions(data_version) if data_version is not None else []
+
+@st.cache_resource(max_entries=DATA_CACHE_VERSIONS)
+def comparison_frame(data_version):
+    """多地区对比用的 时间 × (指标, 地区) 宽表：每个数据版本只加载、拼接一次，包含存储中的全部地区。"""
+    if data_version is None:
+        return None
+    return data_store.build_wide_frame(data_store.load_regions(version=data_version))
+
+# =============================================================================
+#  看板显示层：按 (数据版本, 地区) 缓存的格式化结果，切换地区时不再重复格式化
+# =============================================================================
+# 图表横轴用的 'YYYY-MM' 标签：每个数据版本、每个地区只格式化一次
+@st.cache_data
+def month_labels(data_version, location, _times):
+    return data_store.format_month(_times).tolist()
+
+@st.cache_data
+def detail_table_config(data_version, location, columns):
+    """
+    详细数据表的列配置：时间按 YYYY-MM 显示，同比/环比/占比列用前端的百分比格式显示。
+    格式化完全交给浏览器完成，Python 端不复制数据框，也不逐个单元格调用格式化函数。
+    """
+    config = {"时间": st.column_config.DateColumn("时间", format="YYYY-MM")}
+    for col in columns:
+        if data_store.is_ratio_column(col):
+            config[col] = st.column_config.NumberColumn(col, format="percent")
+    return config
+
+def show_detail_table(data_version, location, location_df):
+    # 数据已按时间升序存储，倒序切片即可，无需排序或复制
+    st.dataframe(
+        location_df.iloc[::-1], use_container_width=True, hide_index=True,
+        column_config=detail_table_config(data_version, location, tuple(location_df.columns)),
+    )
+
+# =============================================================================
+#  走势图数据：长序列先在服务端降采样，只有缩小到的时间窗口才取全分辨率
+#  各看板的图表配置函数用 @st.cache_data(max_entries=CHART_CACHE_ENTRIES) 缓存
+#  chart_options 的结果，命中缓存时不再构造 pyecharts 对象，也不再序列化
+# =============================================================================
+# 每个 (数据版本, 地区, 指标, 时间窗口) 一条，拖动时间范围滑块会不断产生新组合，同样限制条数
+@st.cache_data(max_entries=CHART_CACHE_ENTRIES)
+def chart_series(data_version, location, columns, start, end, _df):
+    labels = month_labels(data_version, location, _df['时间'])[start:end]
+    return chart_data.decimate(labels, {col: _df[col].to_numpy()[start:end] for col in columns})
+
+def chart_range(data_version, location, location_df):
+    """
+    在图表上方放一个时间范围滑块，返回选中窗口的下标范围 (start, end)。
+    整段历史超过 chart_data.MAX_CHART_POINTS 个点时 chart_series 会先降采样；
+    缩小时间范围后，窗口内的点数不超过上限就直接用全分辨率数据。
+    滑块的 key 带上数据版本：切换到新版本后重新从完整范围开始，新发布的月份会直接显示在图上。
+    """
+    labels = month_labels(data_version, location, location_df['时间'])
+    start, end = 0, len(labels)
+    if len(labels) > 1:
+        first, last = st.select_slider("时间范围", options=labels, value=(labels[0], labels[-1]),
+                                       key=f"chart_range_{data_version}_{location}")
+        start, end = labels.index(first), labels.index(last) + 1
+    return start, end
+
+def chart_options(chart):
+    """把 pyecharts 图表转换成 st_echarts 直接可用的配置字典。"""
+    return json.loads(chart.dump_options())
+
+def show_chart(options, height="500px"):
+    """渲染 chart_options 得到的配置字典；streamlit_echarts 在第一次真正画图时才导入。"""
+    from streamlit_echarts import st_echarts
+    st_echarts(options, height=height)
+
+# =============================================================================
+#  性能面板：各阶段耗时记录在 perf_trace.TRACE_FILE，包括后台刷新进程记录的抓取和处理阶段
+# =============================================================================
+def show_performance_panel(page_span):
+    """结束整页渲染的计时；侧边栏勾选“显示性能面板”时，在页面底部列出各阶段最近的耗时汇总。"""
+    page_span.end()
+    if not st.sidebar.checkbox("显示性能面板", key="perf_panel"):
+        return
+    st.header("性能")
+    st.caption(f"本次页面渲染耗时 {page_span.seconds * 1000:.0f} 毫秒。"
+               f"下表汇总最近 {perf_trace.TRACE_TAIL_LINES} 条耗时记录，单位为毫秒。")
+    summary = perf_trace.summarize(perf_trace.read_spans())
+    if not summary:
+        st.info("还没有耗时记录。")
+        return
+    rows = [{'阶段': name, '次数': stats['count'], '出错': stats['errors'], '最近': stats['last'] * 1000,
+             '中位数': stats[0.5] * 1000, 'P95': stats[0.95] * 1000, '最大': stats['max'] * 1000}
+            for name, stats in summary.items()]
+    st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True,
+                 column_config={col: st.column_config.NumberColumn(col, format="%.1f")
+                                for col in ('最近', '中位数', 'P95', '最大')})
@@ -0,0 +1,615 @@
+import os
+import glob
+import time
+import json
+import shutil
+import hashlib
+import functools
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+import raw_parser
+import derived_metrics
+import perf_trace
+
+# --- 配置区 ---
+PROCESSED_PATH = "processed_data"
+MANIFEST_FILE = os.path.join(PROCESSED_PATH, "manifest.json")
+MASTER_FILE = os.path.join(PROCESSED_PATH, "master.pkl")
+METRICS_FILE = os.path.join(PROCESSED_PATH, "metrics.pkl")  # 地区 × 月份 日历上的派生指标，增量更新时复用
+NUMERIC_COLUMNS = raw_parser.NUMERIC_COLUMNS  # 当月值和海关公布的年初至今累计值
+# 需要解析的文件达到这个数量 (通常是全量重建) 时改用进程池并行解析，文件少时进程启动开销不划算
+PARALLEL_PARSE_MIN_FILES = 8
+PARSE_WORKERS = None  # 进程池大小，None 表示使用全部CPU核心
+# 看板的主数据源：按版本存放的列式存储 (全部地区的 Arrow 文件 + 最新快照 Parquet)，Excel 只作为可选的导出产物。
+# 早期版本按 地区/年份 分区存放 Parquet 文件，读取时仍然兼容
+STORE_PATH = "parquet_store"  # 目录名沿用早期的 Parquet 分区存储，已部署的数据不用迁移
+VERSION_FILENAME = "_version"
+VERSIONS_DIRNAME = "versions"  # 每次发布写一个不可变的版本目录 versions/<版本号>/
+CURRENT_FILENAME = "CURRENT"   # 指向当前版本的指针文件，用原子替换发布新版本
+KEEP_VERSIONS = 3
+VERSION_GRACE_SECONDS = 60 * 60  # 被替换下来的版本至少再保留这么久，固定在旧版本上的看板会话不会读到一半被删
+SNAPSHOT_FILENAME = "latest_snapshot.parquet"
+# 每个版本的全部地区数据写在一份未压缩的 Arrow IPC 文件里，所有看板进程以内存映射方式共享读取
+SHARED_ARROW_FILENAME = "all_regions.arrow"
+REGION_OFFSETS_KEY = b"region_offsets"
+MONTH_ORDINAL_COLUMN = "月序"  # Arrow 文件里时间存成 int32 的月序号 (1970-01 为 0)，读取时再还原成 datetime64
+RATIO_DTYPE = 'float32'        # 同比/环比/占比列在 Arrow 文件里存成 float32，金额列保持 float64
+DISPLAY_SUFFIX = "_显示"  # 最新快照中预先格式化好的显示列的后缀
+RATIO_MARKERS = ('同比', '环比', '占比')  # 列名含这些字样的是比率，按百分比显示
+REGION_CACHE_MAX_BYTES = 64 * 2 ** 20  # 看板按需加载的地区数据框合计超过这个大小时，淘汰最久未访问的地区
+
+# =============================================================================
+#  清单 (manifest)：记录每个原始CSV的 mtime / 大小 / 内容哈希
+# =============================================================================
+def file_digest(file_path):
+    """计算文件内容的 sha1 哈希。"""
+    sha1 = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+def load_manifest():
+    if not os.path.exists(MANIFEST_FILE):
+        return {'locations': [], 'parser_version': raw_parser.PARSER_VERSION, 'files': {}}
+    try:
+        with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # 清单损坏时当作空清单处理，触发一次全量重建
+        return {'locations': [], 'parser_version': raw_parser.PARSER_VERSION, 'files': {}}
+
+def save_manifest(manifest):
+    os.makedirs(PROCESSED_PATH, exist_ok=True)
+    tmp_path = MANIFEST_FILE + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, MANIFEST_FILE)
+
+def scan_raw_files(raw_path, manifest):
+    """
+    对比清单，找出新增/变更以及已删除的原始文件。
+    mtime 和大小都没变的文件直接跳过，不读取内容；变了的再比对内容哈希，
+    这样仅仅被 touch 过的文件不会触发重新处理。
+    返回 (changed_files, removed_files, new_entries)。
+    """
+    old_entries = manifest.get('files', {})
+    new_entries = {}
+    changed_files = []
+    for file_path in sorted(glob.glob(os.path.join(raw_path, "*.csv"))):
+        filename = os.path.basename(file_path)
+        stat = os.stat(file_path)
+        old = old_entries.get(filename)
+        if old and old['mtime_ns'] == stat.st_mtime_ns and old['size'] == stat.st_size:
+            new_entries[filename] = old
+            continue
+
+        digest = file_digest(file_path)
+        new_entries[filename] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha1': digest}
+        if not old or old.get('sha1') != digest:
+            changed_files.append(file_path)
+
+    removed_files = [name for name in old_entries if name not in new_entries]
+    return changed_files, removed_files, new_entries
+
+# =============================================================================
+#  已处理的总表：增量更新时只替换变化月份的行
+# =============================================================================
+def load_master():
+    if not os.path.exists(MASTER_FILE):
+        return None
+    try:
+        return pd.read_pickle(MASTER_FILE)
+    except Exception:
+        return None
+
+def save_master(master_df):
+    os.makedirs(PROCESSED_PATH, exist_ok=True)
+    tmp_path = MASTER_FILE + ".tmp"
+    master_df.to_pickle(tmp_path)
+    os.replace(tmp_path, MASTER_FILE)
+
+# =============================================================================
+#  解析原始文件：文件多时用进程池并行，结果以紧凑数组返回后一次性拼接
+# =============================================================================
+def parse_files(file_paths, locations=None, workers=PARSE_WORKERS):
+    """
+    解析多个原始CSV，返回 [(file_path, raw_parser.parse_raw_arrays 的结果或异常)]，顺序与输入一致。
+    """
+    if len(file_paths) < PARALLEL_PARSE_MIN_FILES or workers == 1:
+        results = []
+        for file_path in file_paths:
+            try:
+                results.append((file_path, raw_parser.parse_raw_arrays(file_path, locations)))
+            except Exception as e:
+                results.append((file_path, e))
+        return results
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(raw_parser.parse_raw_arrays, file_path, locations) for file_path in file_paths]
+        results = []
+        for file_path, future in zip(file_paths, futures):
+            try:
+                results.append((file_path, future.result()))
+            except Exception as e:
+                results.append((file_path, e))
+        return results
+
+def assemble_frame(parsed):
+    """
+    把若干个 (月份, 地区数组, 数值矩阵, ...) 拼成一个数据框：按总行数一次性预分配，再逐段填入，
+    不需要先为每个文件建数据框再 pd.concat。
+    """
+    total = sum(len(regions) for _, regions, _, _ in parsed)
+    regions = np.empty(total, dtype=object)
+    values = np.empty((total, len(NUMERIC_COLUMNS)), dtype='float64')
+    times = np.empty(total, dtype='datetime64[us]')
+    start = 0
+    for month, month_regions, month_values, _ in parsed:
+        end = start + len(month_regions)
+        regions[start:end] = month_regions
+        values[start:end] = month_values
+        times[start:end] = month.to_datetime64()
+        start = end
+
+    df = pd.DataFrame({'地区': pd.array(regions, dtype=str)})
+    for i, col in enumerate(NUMERIC_COLUMNS):
+        df[col] = values[:, i]
+    df['时间'] = times
+    return df
+
+# =============================================================================
+#  派生指标 (同比/环比/年初至今/滚动合计/全国占比) 的缓存
+# =============================================================================
+def load_metrics():
+    if not os.path.exists(METRICS_FILE):
+        return None
+    try:
+        return pd.read_pickle(METRICS_FILE)
+    except Exception:
+        return None
+
+def save_metrics(metrics):
+    os.makedirs(PROCESSED_PATH, exist_ok=True)
+    tmp_path = METRICS_FILE + ".tmp"
+    pd.to_pickle(metrics, tmp_path)
+    os.replace(tmp_path, METRICS_FILE)
+
+def refresh_processed_store(raw_path, locations=None):
+    """
+    增量更新已处理数据：只解析新增/变更的原始CSV，派生指标只重算受影响的月份。
+    locations 为 None (默认) 时保留表格中的全部地区。
+    返回 (metrics, changed_months, errors)，metrics 是 derived_metrics.MetricCube，没有数据时为 None；
+    没有任何变化时 changed_months 为空。
+    """
+    manifest = load_manifest()
+    master_df = load_master()
+    metrics = load_metrics()
+    locations = list(locations) if locations is not None else None
+    full_rebuild = (master_df is None or metrics is None or manifest.get('locations') != locations
+                    or manifest.get('parser_version') != raw_parser.PARSER_VERSION)
+    if full_rebuild:
+        # 保留的地区范围变了、解析规则变了或者缓存丢失，清单作废，所有文件都要重新解析
+        manifest = {'locations': [], 'files': {}}
+
+    changed_files, removed_files, new_entries = scan_raw_files(raw_path, manifest)
+
+    errors = []
+    changed_months = set()
+    parsed = []
+    with perf_trace.span("process.parse", files=len(changed_files)):
+        parsed_files = parse_files(changed_files, locations)
+    for file_path, result in parsed_files:
+        if isinstance(result, Exception):
+            errors.append((file_path, result))
+            # 解析失败的文件不写入清单，下次刷新时会再尝试
+            new_entries.pop(os.path.basename(file_path), None)
+            continue
+        month, _, _, rejected = result
+        changed_months.add(month)
+        parsed.append(result)
+        # 被拒绝的行随文件记录在清单里，文件不变时报告也一直保留
+        new_entries[os.path.basename(file_path)]['rejected'] = rejected
+    for filename in removed_files:
+        changed_months.add(raw_parser.month_of_file(filename))
+
+    if full_rebuild:
+        # 全量重建时所有文件都刚解析过，直接用解析结果拼出总表
+        master_df = assemble_frame(parsed) if parsed else None
+        if master_df is not None:
+            master_df.sort_values(by=['地区', '时间'], inplace=True, ignore_index=True)
+    elif changed_months:
+        kept = master_df[~master_df['时间'].isin(changed_months)]
+        master_df = pd.concat([kept, assemble_frame(parsed)], ignore_index=True)
+        master_df.sort_values(by=['地区', '时间'], inplace=True, ignore_index=True)
+
+    with perf_trace.span("process.metrics", full=full_rebuild):
+        if master_df is None or master_df.empty:
+            metrics = None
+        elif full_rebuild or not metrics.update(master_df, changed_months):
+            # 新出现的地区或更早的月份无法原地增量更新，整张日历重新计算
+            metrics = derived_metrics.MetricCube.from_frame(master_df)
+
+    if master_df is not None and (full_rebuild or changed_months):
+        save_master(master_df)
+        if metrics is not None:
+            save_metrics(metrics)
+    save_manifest({'locations': locations, 'parser_version': raw_parser.PARSER_VERSION, 'files': new_entries})
+    return metrics, sorted(changed_months), errors
+
+def rejected_rows_report(manifest=None):
+    """汇总清单中记录的被拒绝行，返回 文件 / 行号 / 地区 / 原因 四列的数据框。"""
+    manifest = manifest or load_manifest()
+    rows = [{'文件': filename, **row}
+            for filename, entry in sorted(manifest.get('files', {}).items())
+            for row in entry.get('rejected', [])]
+    return pd.DataFrame(rows, columns=['文件', '行号', '地区', '原因'])
+
+# =============================================================================
+#  版本化的列式存储：versions/<版本号>/all_regions.arrow + latest_snapshot.parquet
+#  (早期版本为 地区=xxx/年份=yyyy/data.parquet 分区，只读兼容)
+# =============================================================================
+def build_region_frames(metrics, locations=None):
+    """
+    把派生指标拆成 {地区: DataFrame}，时间列保持 datetime64 类型并按时间升序排好，
+    其余列为 derived_metrics.metric_columns()。locations 为 None 时拆出全部地区。
+    """
+    return metrics.region_frames(locations)
+
+@perf_trace.timed("store.write")
+def write_store(frames_by_location, store_path=STORE_PATH):
+    """
+    把 {地区: DataFrame} 写成一个新的不可变版本 versions/<版本号>/，其中是全部地区的共享 Arrow 文件和最新快照。
+    早期版本的 地区/年份 分区 Parquet 文件只在读取旧版本时用到，新版本不再写入。
+    版本目录先以 .tmp 后缀写完再改名，最后原子替换 CURRENT 指针发布；已发布的版本目录之后不再修改，
+    正在读取旧版本的读者不受影响。发布后清理过期的旧版本。返回新版本号。
+    """
+    version = datetime.now().strftime('%Y%m%d%H%M%S%f')
+    versions_path = os.path.join(store_path, VERSIONS_DIRNAME)
+    tmp_path = os.path.join(versions_path, version + ".tmp")
+    os.makedirs(tmp_path)
+    with open(os.path.join(tmp_path, VERSION_FILENAME), 'w', encoding='utf-8') as f:
+        f.write(version)
+    snapshot = build_latest_snapshot(frames_by_location)
+    pq.write_table(pa.Table.from_pandas(snapshot), os.path.join(tmp_path, SNAPSHOT_FILENAME))
+    write_shared_arrow(frames_by_location, os.path.join(tmp_path, SHARED_ARROW_FILENAME))
+    os.rename(tmp_path, os.path.join(versions_path, version))
+
+    pointer_tmp = os.path.join(store_path, CURRENT_FILENAME + ".tmp")
+    with open(pointer_tmp, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(pointer_tmp, os.path.join(store_path, CURRENT_FILENAME))
+    collect_old_versions(store_path)
+    return version
+
+def list_versions(store_path=STORE_PATH):
+    """已发布的全部版本号，从旧到新排列 (版本号是时间戳，字符串顺序即时间顺序)。"""
+    versions_path = os.path.join(store_path, VERSIONS_DIRNAME)
+    if not os.path.isdir(versions_path):
+        return []
+    return sorted(name for name in os.listdir(versions_path) if not name.endswith(".tmp"))
+
+def collect_old_versions(store_path=STORE_PATH, keep=KEEP_VERSIONS, grace_seconds=VERSION_GRACE_SECONDS):
+    """
+    删除旧版本：最新的 keep 个版本和当前版本始终保留，其余版本在被下一个版本替换
+    grace_seconds 秒之后才删除。写到一半中断留下的 .tmp 目录、旧版单目录布局留下的文件也一并清理。
+    文件仍被其他进程打开时 (Windows) 删除会失败，留到下次发布时再试。
+    """
+    versions_path = os.path.join(store_path, VERSIONS_DIRNAME)
+    current = read_version(store_path)
+    versions = list_versions(store_path)
+    now = time.time()
+    for older, newer in zip(versions[:-keep], versions[1:]):
+        superseded_at = os.path.getmtime(os.path.join(versions_path, newer))
+        if older != current and now - superseded_at >= grace_seconds:
+            shutil.rmtree(os.path.join(versions_path, older), ignore_errors=True)
+    for name in os.listdir(versions_path):
+        path = os.path.join(versions_path, name)
+        if name.endswith(".tmp") and now - os.path.getmtime(path) >= grace_seconds:
+            shutil.rmtree(path, ignore_errors=True)
+
+    if os.path.exists(os.path.join(store_path, CURRENT_FILENAME)):
+        for name in os.listdir(store_path):
+            path = os.path.join(store_path, name)
+            if name.startswith("地区="):
+                shutil.rmtree(path, ignore_errors=True)
+            elif name in (VERSION_FILENAME, SNAPSHOT_FILENAME):
+                os.remove(path)
+
+# =============================================================================
+#  跨进程共享的内存映射数据层
+#  同一台机器上的多个看板进程映射同一个 Arrow 文件，数据页由操作系统的页缓存共享，
+#  每个进程不再各自解析、各自保存一份完整数据。文件路径包含版本号，新版本发布后自然换成新文件。
+# =============================================================================
+def write_shared_arrow(frames_by_location, path):
+    """
+    把全部地区按地区顺序首尾相接写成一张未压缩的 Arrow 表 (单个 record batch，数据在文件中连续存放)，
+    各地区的 (起始行, 行数) 记在 schema 元数据里，行上不再重复存地区名。
+    时间存成 int32 月序号，比率列存成 float32 (显示只到 0.01%)；金额列保持 float64：
+    全国的年初至今金额超过 float32 能精确表示的范围，缺月又是 NaN，不能用 int64。
+    数值列直接由 numpy 数组构建，NaN 保持为 NaN 而不是 null，读取时才能零拷贝转换成 pandas。
+    """
+    columns = []
+    for df in frames_by_location.values():
+        columns.extend(col for col in df.columns if col not in columns)
+    offsets, start = {}, 0
+    for location, df in frames_by_location.items():
+        offsets[location] = (start, len(df))
+        start += len(df)
+
+    arrays = {}
+    for col in columns:
+        if col == '时间':
+            parts = [df['时间'].to_numpy(dtype='datetime64[M]').astype('int32') for df in frames_by_location.values()]
+            arrays[MONTH_ORDINAL_COLUMN] = pa.array(np.concatenate(parts) if parts else np.array([], dtype='int32'))
+            continue
+        dtype = RATIO_DTYPE if is_ratio_column(col) else 'float64'
+        parts = [df[col].to_numpy(dtype=dtype) if col in df.columns else np.full(len(df), np.nan, dtype=dtype)
+                 for df in frames_by_location.values()]
+        arrays[col] = pa.array(np.concatenate(parts) if parts else np.array([], dtype=dtype))
+    metadata = {REGION_OFFSETS_KEY: json.dumps(offsets, ensure_ascii=False).encode('utf-8')}
+    table = pa.table(arrays).replace_schema_metadata(metadata)
+    with ipc.new_file(path, table.schema) as writer:
+        writer.write_table(table)
+
+@functools.lru_cache(maxsize=2)
+def open_shared_arrow(path):
+    """
+    以只读内存映射方式打开 Arrow 文件，返回 (表, {地区: (起始行, 行数)})。
+    每个进程对同一版本只映射一次，最多同时保留两个版本 (当前版本和会话固定的上一个版本)。
+    """
+    table = ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    offsets = json.loads(table.schema.metadata[REGION_OFFSETS_KEY].decode('utf-8'))
+    return table, offsets
+
+def shared_arrow_path(version=None, store_path=STORE_PATH):
+    """某个版本的共享 Arrow 文件路径；早期版本没有这个文件时返回 None，读取退回到 Parquet 分区。"""
+    path = os.path.join(version_path(version, store_path), SHARED_ARROW_FILENAME)
+    return path if os.path.exists(path) else None
+
+def store_exists(store_path=STORE_PATH):
+    return read_version(store_path) is not None
+
+def read_version(store_path=STORE_PATH):
+    """读取当前数据版本号，开销只是读一个很小的指针文件；存储不存在时返回 None。"""
+    # 旧版单目录布局的存储没有 CURRENT 指针，版本号写在根目录的 _version 里
+    for filename in (CURRENT_FILENAME, VERSION_FILENAME):
+        try:
+            with open(os.path.join(store_path, filename), 'r', encoding='utf-8') as f:
+                return f.read().strip()
+        except OSError:
+            continue
+    return None
+
+def version_exists(version, store_path=STORE_PATH):
+    return version is not None and (version in list_versions(store_path) or version == read_version(store_path))
+
+def version_path(version=None, store_path=STORE_PATH):
+    """某个版本的数据目录；version 为 None 时取当前版本。旧版单目录布局的存储返回根目录。"""
+    version = version or read_version(store_path)
+    path = os.path.join(store_path, VERSIONS_DIRNAME, version) if version else None
+    return path if path and os.path.isdir(path) else store_path
+
+def list_regions(version=None, store_path=STORE_PATH):
+    if not store_exists(store_path):
+        return []
+    arrow_path = shared_arrow_path(version, store_path)
+    if arrow_path:
+        return sorted(open_shared_arrow(arrow_path)[1])
+    path = version_path(version, store_path)
+    return sorted(name.split("=", 1)[1] for name in os.listdir(path) if name.startswith("地区="))
+
+def load_region(location, version=None, store_path=STORE_PATH):
+    """
+    读取指定版本 (默认当前版本) 中的一个地区，地区不存在时返回 None。
+    有共享 Arrow 文件时从内存映射的表中切片，数值列零拷贝，只有时间列由月序号还原时分配一小块内存；
+    早期版本没有 Arrow 文件，读取该地区的全部年份分区。
+    """
+    arrow_path = shared_arrow_path(version, store_path)
+    if arrow_path:
+        table, offsets = open_shared_arrow(arrow_path)
+        if location not in offsets:
+            return None
+        start, length = offsets[location]
+        region = table.slice(start, length)
+        if MONTH_ORDINAL_COLUMN not in region.column_names:
+            # 早期版本的 Arrow 文件直接存 timestamp 时间列
+            return region.to_pandas(split_blocks=True)
+        ordinals = region.column(MONTH_ORDINAL_COLUMN).to_numpy()
+        df = region.drop_columns([MONTH_ORDINAL_COLUMN]).to_pandas(split_blocks=True)
+        df.insert(0, '时间', ordinals.astype('datetime64[M]').astype('datetime64[us]'))
+        return df
+
+    path = version_path(version, store_path)
+    files = sorted(glob.glob(os.path.join(path, f"地区={location}", "年份=*", "*.parquet")))
+    if not files:
+        return None
+    tables = [pq.read_table(path, memory_map=True) for path in files]
+    df = pa.concat_tables(tables).to_pandas()
+    if not pd.api.types.is_datetime64_any_dtype(df['时间']):
+        # 兼容旧版本存储中 'YYYY-MM' 字符串格式的时间列
+        df['时间'] = pd.to_datetime(df['时间'], format='%Y-%m')
+    return df
+
+@perf_trace.timed("store.load")
+def load_regions(locations=None, version=None, store_path=STORE_PATH):
+    """读取多个地区，返回 {地区: DataFrame}；locations 为 None 时读取全部地区。"""
+    version = version or read_version(store_path)
+    if locations is None:
+        locations = list_regions(version, store_path)
+    data_by_location = {}
+    for location in locations:
+        df = load_region(location, version, store_path)
+        if df is not None:
+            data_by_location[location] = df
+    return data_by_location
+
+class RegionFrames:
+    """
+    某个数据版本的地区数据的按需访问器，用法和 {地区: DataFrame} 一样 (get / [] / in / len / 遍历地区名)。
+    地区在第一次被访问时才读取，之后放在 LRU 缓存里；缓存的数据框合计超过 max_bytes 时淘汰最久未访问的。
+    首屏只需要概览卡片 (来自最新月份快照) 和选中的那一个地区，加载量和内存随实际查看的地区数增长，
+    而不是随存储里的地区总数增长。多个看板会话共享同一个访问器，读写缓存时加锁。
+    """
+
+    def __init__(self, version=None, max_bytes=REGION_CACHE_MAX_BYTES, store_path=STORE_PATH):
+        self.version = version or read_version(store_path)
+        self.max_bytes = max_bytes
+        self.store_path = store_path
+        self.regions = list_regions(self.version, store_path) if self.version else []
+        self._known = set(self.regions)
+        self._frames = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, location, default=None):
+        if location not in self._known:
+            return default
+        with self._lock:
+            df = self._frames.get(location)
+            if df is not None:
+                self._frames.move_to_end(location)
+                return df
+        df = load_region(location, self.version, self.store_path)
+        if df is None:
+            return default
+        with self._lock:
+            if location not in self._frames:
+                self._frames[location] = df
+                self._bytes += int(df.memory_usage(index=True).sum())
+                # 至少保留刚加载的这一个地区，哪怕它本身就超过上限
+                while self._bytes > self.max_bytes and len(self._frames) > 1:
+                    _, evicted = self._frames.popitem(last=False)
+                    self._bytes -= int(evicted.memory_usage(index=True).sum())
+            return self._frames[location]
+
+    def __getitem__(self, location):
+        df = self.get(location)
+        if df is None:
+            raise KeyError(location)
+        return df
+
+    def __contains__(self, location):
+        return location in self._known
+
+    def __iter__(self):
+        return iter(self.regions)
+
+    def __len__(self):
+        return len(self.regions)
+
+    def items(self):
+        for location in self.regions:
+            df = self.get(location)
+            if df is not None:
+                yield location, df
+
+    def cached_regions(self):
+        """当前缓存中的地区 (从最久未访问到最近访问) 和它们合计占用的字节数。"""
+        with self._lock:
+            return list(self._frames), self._bytes
+
+def format_month(times):
+    """把 datetime64 时间列格式化成 'YYYY-MM' 字符串，只在需要显示时调用。"""
+    return times.dt.strftime('%Y-%m')
+
+# =============================================================================
+#  最新月份快照：每个地区一行，数值和同比都已格式化好，概览卡片直接查表渲染
+# =============================================================================
+def format_value(value):
+    """将数值格式化为带千位分隔符的字符串。"""
+    if pd.isna(value):
+        return "N/A"
+    return f"{value:,.0f}"
+
+def is_ratio_column(col):
+    return any(marker in col for marker in RATIO_MARKERS)
+
+def format_delta(yoy_value):
+    """将小数值格式化为带正负号的百分比字符串，以便st.metric能正确上色和显示。"""
+    if pd.isna(yoy_value):
+        return None
+    return f"{yoy_value:+.2%}"
+
+def build_latest_snapshot(frames_by_location):
+    """
+    取每个地区最新月份的一行，返回以地区为索引的快照表。
+    每个指标列 (包括时间) 保留原始数值，另外附带一列 '<列名>_显示' 的格式化字符串。
+    各地区的数据已按时间升序排好，最新月份就是最后一行。
+    """
+    rows = []
+    for location, df in frames_by_location.items():
+        if df.empty:
+            continue
+        latest = df.iloc[-1]
+        row = {'地区': location, '时间': latest['时间'], '时间' + DISPLAY_SUFFIX: f"{latest['时间']:%Y-%m}"}
+        for col in df.columns.drop('时间'):
+            row[col] = latest[col]
+            row[col + DISPLAY_SUFFIX] = format_delta(latest[col]) if is_ratio_column(col) else format_value(latest[col])
+        rows.append(row)
+    return pd.DataFrame(rows).set_index('地区')
+
+def load_latest_snapshot(version=None, store_path=STORE_PATH):
+    path = os.path.join(version_path(version, store_path), SNAPSHOT_FILENAME)
+    if not os.path.exists(path):
+        return None
+    snapshot = pq.read_table(path, memory_map=True).to_pandas()
+    if '时间' + DISPLAY_SUFFIX not in snapshot.columns:
+        # 旧格式的快照，交给调用方从完整数据重新计算
+        return None
+    return snapshot
+
+# =============================================================================
+#  多地区对比用的宽表：行是时间，列是 (指标, 地区)
+# =============================================================================
+def build_wide_frame(frames_by_location):
+    """
+    把各地区的数据一次性拼成一个宽表，行索引是时间 (各地区时间的并集，升序)，
+    列是 (指标, 地区) 两级索引。对比视图取 wide[指标] 就得到 时间 × 地区 的矩阵，
+    选多少个地区都只是列选择，不需要再逐个地区拼接。
+    """
+    frames = {location: df.set_index('时间') for location, df in frames_by_location.items() if not df.empty}
+    if not frames:
+        return pd.DataFrame()
+    wide = pd.concat(frames, axis=1, names=['地区', '指标'])
+    return wide.swaplevel(axis=1).sort_index(axis=1).sort_index()
+
+# =============================================================================
+#  Excel 工作簿：可选的导出产物，以及从旧工作簿一次性导入
+# =============================================================================
+@perf_trace.timed("store.export_excel")
+def export_excel(frames_by_location, output_filename):
+    """
+    导出Excel汇总报告，时间列写成 'YYYY-MM' 字符串，与原来的报告格式一致。
+    先写临时文件再原子替换，正在打开旧报告的人不会读到写了一半的文件。
+    """
+    root, ext = os.path.splitext(output_filename)
+    tmp_path = f"{root}.tmp{ext}"
+    with pd.ExcelWriter(tmp_path, engine='openpyxl') as writer:
+        for location, df in frames_by_location.items():
+            df.assign(时间=format_month(df['时间'])).to_excel(writer, sheet_name=location, index=False)
+    os.replace(tmp_path, output_filename)
+
+def import_workbook(workbook_filename, store_path=STORE_PATH):
+    """把已有的Excel汇总工作簿 (每个地区一个sheet) 导入到列式存储中。"""
+    xls = pd.ExcelFile(workbook_filename)
+    frames = {}
+    for sheet_name in xls.sheet_names:
+        df = xls.parse(sheet_name, dtype={'时间': str})
+        df['时间'] = pd.to_datetime(df['时间'], format='%Y-%m')
+        if '进出口_环比' not in df.columns:
+            # 旧版汇总表 (没有环比等派生列) 是按列位置解析生成的，进口_ 和 出口_ 两组列的数据是反的
+            df = df.rename(columns=lambda col: col.replace('进口_', '出口_', 1) if col.startswith('进口_')
+                           else col.replace('出口_', '进口_', 1) if col.startswith('出口_') else col)
+            ordered = [col for col in derived_metrics.metric_columns() if col in df.columns]
+            df = df[['时间'] + ordered + [col for col in df.columns if col not in ordered and col != '时间']]
+        frames[sheet_name] = df.sort_values(by='时间', ignore_index=True)
+    write_store(frames, store_path)
+    return frames
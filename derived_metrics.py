@@ -0,0 +1,189 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# --- 配置区 ---
+FLOWS = ['进出口', '进口', '出口']
+NATIONAL_REGION = '全国'
+# 每个指标 (进出口/进口/出口) 派生出的列，列名为 '<指标><后缀>'，可视化最终.py 直接使用这些列名
+METRIC_SUFFIXES = ['_当月', '_当月同比', '_年初至今', '_年初至今同比', '_环比', '_近3月', '_近12月', '_全国占比']
+# 增量更新时向前多取的月数：派生指标最远依赖 23 个月前的数据 (去年同期的年初至今)
+LOOKBACK_MONTHS = 24
+# 总表中海关公布的年初至今累计值的列名后缀 (见 raw_parser.CUMULATIVE_COLUMNS)
+REPORTED_YTD_SUFFIX = '_年初至今'
+
+def metric_columns():
+    return [flow + suffix for flow in FLOWS for suffix in METRIC_SUFFIXES]
+
+# =============================================================================
+#  向量化计算：数组形状为 (指标, 地区, 月份)，月份轴是连续的日历月，缺月为 NaN
+# =============================================================================
+def shift(values, months):
+    """沿月份轴向后平移，前面补 NaN：结果的第 t 个月是原数组第 t - months 个月的值。"""
+    shifted = np.full_like(values, np.nan)
+    if months < values.shape[-1]:
+        shifted[..., months:] = values[..., :values.shape[-1] - months]
+    return shifted
+
+def growth(values, months):
+    """与 months 个月前相比的增长率；基期缺失或为 0 时为 NaN。"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = values / shift(values, months) - 1
+    rate[~np.isfinite(rate)] = np.nan
+    return rate
+
+def window_sum(values, months):
+    """近 months 个月合计；窗口内有缺月或历史不足时为 NaN，而不是把缺失当成 0。"""
+    total = np.full_like(values, np.nan)
+    if values.shape[-1] >= months:
+        total[..., months - 1:] = sliding_window_view(values, months, axis=-1).sum(axis=-1)
+    return total
+
+def year_to_date(values, first_month, reported=None):
+    """
+    年初至今累计。有海关公布的累计值 (reported 中非 NaN 的位置) 时直接采用：前面月份发布后的修订
+    只体现在公布的累计值里，1、2月合并发布的年份也没有单独的1月数据可供累加。
+    没有公布值的月份退回到 上月累计 + 当月值，1月从当月值重新开始；
+    年内前面的月份缺失且没有公布值时 NaN 会一直传递到年底，不会得到偏小的累计值。
+    按月份逐步推进，每一步对全部指标和地区向量化计算。
+    """
+    ytd = np.full_like(values, np.nan)
+    running = np.full(values.shape[:-1], np.nan)
+    for t in range(values.shape[-1]):
+        if (first_month.month - 1 + t) % 12 == 0:
+            running = values[..., t].copy()
+        else:
+            running = running + values[..., t]
+        if reported is not None:
+            running = np.where(np.isnan(reported[..., t]), running, reported[..., t])
+        ytd[..., t] = running
+    return ytd
+
+def derive(values, first_month, national_index=None, reported_ytd=None):
+    """
+    由当月值一次性计算全部派生指标，返回 {后缀: 与 values 同形状的数组}。
+    national_index 为全国在地区轴上的位置，没有全国数据时占比为 NaN；
+    reported_ytd 为海关公布的年初至今累计值 (形状同 values，缺失为 NaN)，见 year_to_date。
+    """
+    ytd = year_to_date(values, first_month, reported_ytd)
+    if national_index is None:
+        share = np.full_like(values, np.nan)
+    else:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            share = values / values[:, national_index:national_index + 1, :]
+        share[~np.isfinite(share)] = np.nan
+    return {
+        '_当月': values,
+        '_当月同比': growth(values, 12),
+        '_年初至今': ytd,
+        '_年初至今同比': growth(ytd, 12),
+        '_环比': growth(values, 1),
+        '_近3月': window_sum(values, 3),
+        '_近12月': window_sum(values, 12),
+        '_全国占比': share,
+    }
+
+# =============================================================================
+#  地区 × 月份 的完整日历
+# =============================================================================
+class MetricCube:
+    """
+    按 (地区 × 连续日历月) 对齐的当月值和派生指标。
+    同比、环比都按日历位置取值，某个月缺失时得到 NaN，不会像 pct_change 那样错位到别的月份。
+    reported_ytd 与 values 同形状，保存海关公布的年初至今累计值，没有公布值的位置为 NaN。
+    """
+
+    def __init__(self, regions, months, values, reported_ytd=None):
+        self.regions = pd.Index(regions, name='地区')
+        self.months = pd.DatetimeIndex(months, name='时间')
+        self.values = values
+        self.reported_ytd = reported_ytd if reported_ytd is not None else np.full_like(values, np.nan)
+        self.metrics = {}
+        self.recompute()
+
+    @classmethod
+    def from_frame(cls, master_df):
+        """
+        由 地区 / 时间 / 进出口 / 进口 / 出口 的长表构建；
+        表中有 '进出口_年初至今' 等公布的累计列时一并读入。
+        """
+        regions = pd.Index(sorted(master_df['地区'].unique()))
+        months = pd.date_range(master_df['时间'].min(), master_df['时间'].max(), freq='MS')
+        values = np.full((len(FLOWS), len(regions), len(months)), np.nan)
+        reported_ytd = np.full_like(values, np.nan)
+        cls._fill(values, reported_ytd, regions, months, master_df)
+        return cls(regions, months, values, reported_ytd)
+
+    @staticmethod
+    def _fill(values, reported_ytd, regions, months, df):
+        region_codes = regions.get_indexer(df['地区'])
+        month_codes = months.get_indexer(df['时间'])
+        for i, flow in enumerate(FLOWS):
+            values[i, region_codes, month_codes] = df[flow].to_numpy(dtype='float64')
+            if flow + REPORTED_YTD_SUFFIX in df.columns:
+                reported_ytd[i, region_codes, month_codes] = df[flow + REPORTED_YTD_SUFFIX].to_numpy(dtype='float64')
+
+    def national_index(self):
+        return self.regions.get_loc(NATIONAL_REGION) if NATIONAL_REGION in self.regions else None
+
+    def recompute(self, start=0):
+        """重算第 start 个月及以后的派生指标，只取往前 LOOKBACK_MONTHS 个月的窗口参与计算。"""
+        window_start = max(0, start - LOOKBACK_MONTHS)
+        derived = derive(self.values[..., window_start:], self.months[window_start], self.national_index(),
+                         self.reported_ytd[..., window_start:])
+        for suffix, array in derived.items():
+            old = self.metrics.get(suffix)
+            if old is None or old.shape != self.values.shape:
+                # 月份轴变长了：保留已算好的部分，新增的月份先补 NaN
+                self.metrics[suffix] = np.full_like(self.values, np.nan)
+                if old is not None:
+                    self.metrics[suffix][..., :old.shape[-1]] = old
+            self.metrics[suffix][..., start:] = array[..., start - window_start:]
+
+    def update(self, master_df, changed_months):
+        """
+        某几个月份的数据变化 (新发布、修订或删除) 后增量更新。
+        出现新地区或者月份范围向前扩展时无法原地更新，返回 False，由调用方全量重建。
+        """
+        if not changed_months:
+            return True
+        changed = master_df[master_df['时间'].isin(changed_months)]
+        if not changed['地区'].isin(self.regions).all() or min(changed_months) < self.months[0]:
+            return False
+
+        last_month = max(max(changed_months), self.months[-1])
+        if last_month > self.months[-1]:
+            months = pd.date_range(self.months[0], last_month, freq='MS')
+            values = np.full(self.values.shape[:-1] + (len(months),), np.nan)
+            reported_ytd = np.full_like(values, np.nan)
+            values[..., :len(self.months)] = self.values
+            reported_ytd[..., :len(self.months)] = self.reported_ytd
+            self.months, self.values, self.reported_ytd = pd.DatetimeIndex(months, name='时间'), values, reported_ytd
+
+        month_codes = self.months.get_indexer(sorted(changed_months))
+        self.values[..., month_codes] = np.nan
+        self.reported_ytd[..., month_codes] = np.nan
+        self._fill(self.values, self.reported_ytd, self.regions, self.months, changed)
+        self.recompute(int(month_codes.min()))
+        return True
+
+    def region_frames(self, locations=None):
+        """
+        拆成 {地区: DataFrame}：时间列为 datetime64 并按时间升序，其余列见 metric_columns()。
+        每个地区去掉首尾没有数据的月份，中间缺失的月份保留为空值行。
+        """
+        columns = metric_columns()
+        stacked = np.stack([self.metrics[suffix] for suffix in METRIC_SUFFIXES], axis=1)  # (指标, 后缀, 地区, 月份)
+        frames = {}
+        for r, location in enumerate(self.regions):
+            if locations is not None and location not in locations:
+                continue
+            present = np.flatnonzero(~np.isnan(self.values[:, r, :]).all(axis=0))
+            if not len(present):
+                continue
+            first, last = present[0], present[-1] + 1
+            block = stacked[:, :, r, first:last].reshape(len(columns), -1).T
+            df = pd.DataFrame(block, columns=columns)
+            df.insert(0, '时间', self.months[first:last])
+            frames[location] = df
+        return frames
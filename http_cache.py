@@ -0,0 +1,72 @@
+import os
+import json
+import hashlib
+import threading
+
+# --- 配置区 ---
+HTTP_CACHE_PATH = "http_cache"
+
+class HttpCache:
+    """
+    按URL缓存页面：记录 ETag / Last-Modified 和正文哈希，正文本身单独存成文件。
+    再次请求时带上条件请求头；服务器返回 304 或正文哈希不变，都视为页面没有变化。
+    """
+
+    def __init__(self, path=HTTP_CACHE_PATH):
+        self.path = path
+        self.index_file = os.path.join(path, "index.json")
+        self._lock = threading.Lock()
+        self._entries = {}
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+
+    def _body_file(self, url):
+        return os.path.join(self.path, hashlib.sha1(url.encode('utf-8')).hexdigest() + ".html")
+
+    def has(self, url):
+        return url in self._entries and os.path.exists(self._body_file(url))
+
+    def conditional_headers(self, url):
+        """返回条件请求头；缓存里没有这个页面时返回空字典。"""
+        if not self.has(url):
+            return {}
+        entry = self._entries[url]
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def cached_body(self, url):
+        with open(self._body_file(url), 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def store(self, url, response, text):
+        """保存一次 200 响应，返回正文相对上次缓存是否有变化 (第一次见到的页面算作有变化)。"""
+        digest = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        with self._lock:
+            old = self._entries.get(url)
+            changed = old is None or old.get('sha1') != digest
+            if changed or not os.path.exists(self._body_file(url)):
+                os.makedirs(self.path, exist_ok=True)
+                with open(self._body_file(url), 'w', encoding='utf-8') as f:
+                    f.write(text)
+            self._entries[url] = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'sha1': digest,
+            }
+        return changed
+
+    def save(self):
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = self.index_file + ".tmp"
+        with self._lock:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.index_file)
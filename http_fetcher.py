@@ -0,0 +1,245 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from lxml import html as lxml_html
+import crawler
+import crawl_journal
+import perf_trace
+
+# --- 配置区 ---
+# 海关网站的反爬挑战页通常以这些状态码返回一段需要执行JS才能拿到内容的页面
+JS_GATE_STATUS_CODES = {202, 403, 412, 521}
+REQUEST_TIMEOUT = 30
+# 海关会在原URL上重新发布修订后的表格，年份页面不一定随之变化。最新发布的月份及之前 12 个月
+# (含去年同月) 的详情页每次刷新都发条件请求复查，没变化时只是一个 304
+REVISION_WINDOW_MONTHS = 13
+DETAIL_CONTAINER_XPATH = "//div[contains(concat(' ', normalize-space(@class), ' '), ' easysite-news-text ')]"
+
+class JsGatedError(Exception):
+    """页面内容需要执行JS才能拿到，静态HTTP抓取无能为力，需要交给浏览器。"""
+
+class HostRateLimiter:
+    """线程版的按主机限速器，与 crawler.HostRateLimiter 行为一致。"""
+
+    def __init__(self, min_interval=crawler.DEFAULT_MIN_INTERVAL):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_slot = {}
+
+    def wait(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, 0))
+            self._next_slot[host] = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+# =============================================================================
+#  静态页面抓取：连接池复用的 requests.Session + lxml 解析
+# =============================================================================
+class StaticFetcher:
+    """
+    不启动浏览器，直接用HTTP请求读取索引页和详情页；遇到JS挑战页时抛出 JsGatedError。
+    传入 cache 时所有请求都是条件请求，页面是否变化记录在返回值里。
+    一个实例对应一次刷新：同一页面在本次刷新中只请求一次，之后复用第一次的结果，
+    否则探测时发现的变化会被第二次条件请求 (304) 掩盖。
+    """
+
+    def __init__(self, base_url=crawler.BASE_URL, pool_size=crawler.DEFAULT_CONCURRENCY,
+                 min_interval=crawler.DEFAULT_MIN_INTERVAL, session=None, cache=None):
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.cache = cache
+        self._index_document = None
+        self._month_links = {}
+        self._documents = {}
+        self.index_changed = True
+        self.limiter = HostRateLimiter(min_interval)
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({'User-Agent': crawler.USER_AGENT})
+
+    def get_document(self, url, expected_xpath):
+        """
+        请求页面并解析，返回 (document, changed)。
+        状态码是挑战页，或者页面里找不到预期元素但含有脚本时，视为JS拦截。
+        """
+        if url in self._documents:
+            return self._documents[url]
+        self.limiter.wait(url)
+        headers = self.cache.conditional_headers(url) if self.cache else {}
+        with perf_trace.span("crawl.navigate", page="http"):
+            response = self.session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+        if response.status_code == 304 and headers:
+            self._documents[url] = lxml_html.fromstring(self.cache.cached_body(url)), False
+            return self._documents[url]
+        if response.status_code in JS_GATE_STATUS_CODES:
+            raise JsGatedError(f"{url} 返回状态码 {response.status_code}")
+        response.raise_for_status()
+        if response.encoding is None or response.encoding.lower() == 'iso-8859-1':
+            response.encoding = response.apparent_encoding
+
+        document = lxml_html.fromstring(response.text)
+        if not document.xpath(expected_xpath):
+            if document.xpath("//script"):
+                raise JsGatedError(f"{url} 的内容需要执行JS才能获取")
+            raise ValueError(f"{url} 中未找到预期的页面元素")
+        # 只缓存确认有效的页面，挑战页和错误页不会污染缓存
+        changed = self.cache.store(url, response, response.text) if self.cache else True
+        self._documents[url] = document, changed
+        return document, changed
+
+    def year_index_url(self, year):
+        # 总索引页在一次刷新中只请求一次，各年份共用
+        if self._index_document is None:
+            self._index_document, self.index_changed = self.get_document(self.base_url, "//div[@class='customs-foot']")
+        links = self._index_document.xpath(f"//a[contains(text(), '{year}')]/@href")
+        if not links:
+            raise ValueError(f"索引页中未找到 {year} 年的链接")
+        return urljoin(self.base_url, links[0])
+
+    def month_links(self, year):
+        """
+        返回 (指定年份所有月份的 [(月份, 详情页URL)], 年份页面是否有变化)。
+        直接取链接的 href，不需要点击。
+        """
+        # 同一次刷新里探测过的年份直接复用结果，否则第二次条件请求会把“有变化”掩盖掉
+        if year in self._month_links:
+            return self._month_links[year]
+        url = self.year_index_url(year)
+        row_xpath = f"//tr[contains(., '{crawler.TABLE_NAME}')]"
+        document, changed = self.get_document(url, row_xpath)
+        month_links = []
+        for link in document.xpath(row_xpath)[0].xpath(".//a[@href]"):
+            month = crawler.parse_month_text(link.text_content())
+            if month:
+                month_links.append((month, urljoin(url, link.get('href'))))
+        self._month_links[year] = (month_links, changed)
+        return month_links, changed
+
+    def month_table(self, url, only_if_changed=False):
+        """解析详情页中的数据表格；only_if_changed 为 True 且页面没有变化时返回 None。"""
+        document, changed = self.get_document(url, DETAIL_CONTAINER_XPATH)
+        if only_if_changed and not changed:
+            return None
+        with perf_trace.span("crawl.extract_table"):
+            table_html = lxml_html.tostring(document.xpath(DETAIL_CONTAINER_XPATH)[0], encoding='unicode')
+        df = crawler.parse_table_html(table_html)
+        if df is None:
+            raise ValueError(f"{url} 中没有数据表格")
+        return df
+
+def month_number(year, month):
+    return year * 12 + month - 1
+
+def in_revision_window(year, month, newest):
+    """(year, month) 是否在最新发布的月份 newest = (年, 月) 往前 REVISION_WINDOW_MONTHS 个月之内。"""
+    return month_number(*newest) - month_number(year, month) < REVISION_WINDOW_MONTHS
+
+def probe_for_changes(fetcher, years):
+    """
+    廉价的“有没有变化”探测：对总索引页、修订窗口涉及的年份页面 (最新年份和上一年)
+    以及窗口内各月的详情页发条件请求。全部没变化 (304 或正文哈希相同) 时返回 False；
+    没有缓存或被JS拦截时保守地返回 True。
+    """
+    if fetcher.cache is None or not years:
+        return True
+    try:
+        links = []
+        for year in sorted(years)[-2:]:
+            month_links, year_changed = fetcher.month_links(year)
+            if year_changed:
+                return True
+            links += [(year, month, url) for month, url in month_links]
+        if fetcher.index_changed:
+            return True
+        if not links:
+            return False
+        newest = max((year, month) for year, month, _ in links)
+        for year, month, url in links:
+            if in_revision_window(year, month, newest) and fetcher.get_document(url, DETAIL_CONTAINER_XPATH)[1]:
+                return True
+    except Exception:
+        return True
+    return False
+
+def fetch_new_months(fetcher, raw_path, existing_files, years, on_progress=None, journal=None):
+    """
+    先用静态HTTP抓取：读取各年份索引，下载本地缺少的月份。
+    有缓存时，已下载的月份中处于修订窗口 (最新发布的 REVISION_WINDOW_MONTHS 个月) 内的、
+    以及年份页面发生变化的那一年里的，都会发条件请求复查；海关在原URL上重新发布的修订表格
+    会被重新下载覆盖 (内容相同的话后续处理会按哈希跳过)。
+    传入 journal (crawl_journal.CrawlJournal) 时，缺少的月份先登记到任务日志，只下载到期的任务，
+    以前失败过、这次年份索引没能读到的月份也会一起重试。
+    被JS拦截的年份和月份不在这里报错，而是返回给调用方交给浏览器处理。
+    返回 (新下载的文件列表, 错误列表, 需要浏览器处理的年份, 需要浏览器处理的 [(年, 月, URL)])。
+    """
+    report = on_progress or (lambda message, fraction=None: None)
+    downloaded, errors = [], []
+    gated_years, gated_tasks = [], []
+
+    missing, existing = [], []
+    for year in years:
+        report(f"正在检查年份: {year}...")
+        try:
+            month_links, year_changed = fetcher.month_links(year)
+            for month, url in month_links:
+                if crawler.month_filename(year, month) not in existing_files:
+                    missing.append((year, month, url))
+                else:
+                    existing.append((year, month, url, year_changed))
+        except JsGatedError:
+            gated_years.append(year)
+        except Exception as e:
+            errors.append((f"{year} 年索引", e))
+
+    rechecks = []
+    if fetcher.cache is not None and (missing or existing):
+        newest = max([(year, month) for year, month, _ in missing] + [(year, month) for year, month, _, _ in existing])
+        rechecks = [(year, month, url, True) for year, month, url, year_changed in existing
+                    if year_changed or in_revision_window(year, month, newest)]
+
+    if journal is not None:
+        journal.add_tasks(missing)
+        discovered = {(year, month) for year, month, _ in missing}
+        missing = [task for task in journal.due_tasks() if crawler.month_filename(task[0], task[1]) not in existing_files]
+        waiting = discovered - {(year, month) for year, month, _ in missing}
+        if waiting:
+            report(f"{len(waiting)} 个月份之前下载失败，还没到重试时间，本次跳过。")
+    tasks = [(year, month, url, False) for year, month, url in missing] + rechecks
+
+    def download(task):
+        year, month, url, only_if_changed = task
+        # 网络抖动、服务器 5xx 等临时错误在本次运行内按指数退避重试；JS拦截直接交给浏览器
+        df = crawl_journal.retry_call(fetcher.month_table, url, only_if_changed, no_retry=(JsGatedError,))
+        return None if df is None else crawler.save_month_table(df, raw_path, year, month)
+
+    with ThreadPoolExecutor(max_workers=fetcher.pool_size) as pool:
+        for finished, (task, future) in enumerate(zip(tasks, [pool.submit(download, task) for task in tasks]), start=1):
+            year, month, url, only_if_changed = task
+            journaled = journal is not None and not only_if_changed
+            try:
+                file_path = future.result()
+                if file_path:
+                    downloaded.append(file_path)
+                if journaled:
+                    journal.mark_done(year, month)
+            except JsGatedError:
+                # 已有的月份只是复查修订，浏览器没有条件请求，不值得为它启动浏览器
+                if not only_if_changed:
+                    gated_tasks.append((year, month, url))
+            except Exception as e:
+                errors.append((f"{year}年{month}月", e))
+                if journaled:
+                    journal.mark_failed(year, month, e)
+            report(f"已完成 {finished}/{len(tasks)}: {year}年{month}月", finished / len(tasks))
+
+    if fetcher.cache is not None:
+        fetcher.cache.save()
+    return downloaded, errors, gated_years, gated_tasks
@@ -0,0 +1,180 @@
+"""
+分阶段耗时记录：抓取、处理、存储读写和看板各区块的渲染都以 span 的形式记录下来。
+
+每个 span 结束时向 TRACE_FILE 追加一行 JSON (后台刷新进程和所有看板进程写同一个文件)，
+看板的性能面板和本地指标端点都从这个文件汇总。
+用法：
+    python perf_trace.py --port 9108     # 在 http://127.0.0.1:9108/metrics 提供 Prometheus 文本格式的汇总，
+                                         # /spans 返回最近的原始记录 (JSON lines)
+"""
+import os
+import json
+import time
+import argparse
+import functools
+import threading
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+
+# --- 配置区 ---
+TRACE_ENABLED = True
+TRACE_FILE = "perf_trace.jsonl"
+TRACE_MAX_BYTES = 5 * 2 ** 20  # 超过这个大小时把当前文件改名为 .1 (覆盖更早的)，重新开始写
+TRACE_TAIL_LINES = 20000       # 汇总时只看最近这么多条记录
+METRICS_PREFIX = "customs_span_seconds"
+QUANTILES = (0.5, 0.95, 0.99)
+
+_write_lock = threading.Lock()
+
+# =============================================================================
+#  记录
+# =============================================================================
+class Span:
+    """
+    一段计时。可以用作上下文管理器，也可以用 span() 创建后在任意位置调用 end()，
+    后者适合看板脚本里不方便整体缩进的区块。出错时记录 error 字段后照常抛出异常。
+    """
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+        self.started = time.perf_counter()
+        self.seconds = None
+
+    def end(self, error=None):
+        if self.seconds is None:
+            self.seconds = time.perf_counter() - self.started
+            record(self.name, self.seconds, error=error, **self.labels)
+        return self.seconds
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end(error=exc_type.__name__ if exc_type else None)
+        return False
+
+def span(name, **labels):
+    return Span(name, **labels)
+
+def timed(name):
+    """函数装饰器：每次调用记录一个名为 name 的 span。"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with Span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record(name, seconds, error=None, **labels):
+    if not TRACE_ENABLED:
+        return
+    entry = {'ts': round(time.time(), 3), 'span': name, 'seconds': round(seconds, 6), 'pid': os.getpid()}
+    if labels:
+        entry['labels'] = {key: str(value) for key, value in labels.items()}
+    if error:
+        entry['error'] = error
+    line = json.dumps(entry, ensure_ascii=False) + "\n"
+    with _write_lock:
+        try:
+            if os.path.exists(TRACE_FILE) and os.path.getsize(TRACE_FILE) > TRACE_MAX_BYTES:
+                os.replace(TRACE_FILE, TRACE_FILE + ".1")
+            with open(TRACE_FILE, 'a', encoding='utf-8') as f:
+                f.write(line)
+        except OSError:
+            # 计时只是辅助信息，写不进去也不能影响抓取和看板
+            pass
+
+# =============================================================================
+#  汇总
+# =============================================================================
+def read_spans(limit=TRACE_TAIL_LINES, path=None):
+    """读取最近 limit 条记录，损坏的行 (比如进程被杀时写了一半) 直接跳过。"""
+    path = path or TRACE_FILE
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = deque(f, maxlen=limit)
+    except OSError:
+        return []
+    spans = []
+    for line in lines:
+        try:
+            spans.append(json.loads(line))
+        except ValueError:
+            continue
+    return spans
+
+def summarize(spans):
+    """按 span 名称汇总，返回 {名称: {'count', 'errors', 'sum', 'max', 'last', 分位数...}}，按名称排序。"""
+    by_name = {}
+    for entry in spans:
+        by_name.setdefault(entry['span'], []).append(entry)
+    summary = {}
+    for name in sorted(by_name):
+        entries = by_name[name]
+        seconds = np.array([entry['seconds'] for entry in entries])
+        stats = {'count': len(entries), 'errors': sum(1 for entry in entries if entry.get('error')),
+                 'sum': float(seconds.sum()), 'max': float(seconds.max()), 'last': float(seconds[-1])}
+        for q, value in zip(QUANTILES, np.quantile(seconds, QUANTILES)):
+            stats[q] = float(value)
+        summary[name] = stats
+    return summary
+
+def prometheus_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+def prometheus_text(summary):
+    """把汇总结果转换成 Prometheus 文本格式 (summary 类型)。"""
+    lines = [f"# HELP {METRICS_PREFIX} 各阶段耗时 (最近 {TRACE_TAIL_LINES} 条记录)",
+             f"# TYPE {METRICS_PREFIX} summary"]
+    for name, stats in summary.items():
+        label = prometheus_label(name)
+        for q in QUANTILES:
+            lines.append(f'{METRICS_PREFIX}{{span="{label}",quantile="{q}"}} {stats[q]:.6f}')
+        lines.append(f'{METRICS_PREFIX}_sum{{span="{label}"}} {stats["sum"]:.6f}')
+        lines.append(f'{METRICS_PREFIX}_count{{span="{label}"}} {stats["count"]}')
+    lines.append(f"# TYPE {METRICS_PREFIX}_errors counter")
+    for name, stats in summary.items():
+        lines.append(f'{METRICS_PREFIX}_errors{{span="{prometheus_label(name)}"}} {stats["errors"]}')
+    return "\n".join(lines) + "\n"
+
+# =============================================================================
+#  本地指标端点
+# =============================================================================
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/metrics':
+            body = prometheus_text(summarize(read_spans())).encode('utf-8')
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif path == '/spans':
+            body = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in read_spans()).encode('utf-8')
+            content_type = "application/x-ndjson; charset=utf-8"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve_metrics(port, host="127.0.0.1"):
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    print(f"耗时指标: http://{host}:{port}/metrics  原始记录: http://{host}:{port}/spans")
+    server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="分阶段耗时指标端点")
+    parser.add_argument("--port", type=int, default=9108)
+    parser.add_argument("--host", default="127.0.0.1")
+    args = parser.parse_args()
+    serve_metrics(args.port, args.host)
+
+if __name__ == "__main__":
+    main()
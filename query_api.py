@@ -0,0 +1,265 @@
+"""
+只读查询接口：直接从列式存储 (与看板相同的数据版本) 按 地区 / 指标 / 时间范围 返回数据切片。
+
+其他工具不用再抓看板页面或手工复制Excel汇总表。响应按 (数据版本, 查询参数) 缓存，
+带 ETag (客户端用 If-None-Match 复查时返回 304) 和 gzip 压缩；新版本发布后缓存键自然变化。
+用法：
+    python query_api.py --port 8601
+接口：
+    GET /version                                     当前数据版本
+    GET /regions                                     全部地区
+    GET /columns                                     全部指标列
+    GET /latest?region=全国&region=浙江省             最新月份快照 (不传 region 时返回全部地区)
+    GET /data?region=浙江省&columns=进出口_当月,进出口_当月同比&start=2024-01&end=2025-06
+    GET /data?...&format=arrow                       以 Arrow IPC 流格式返回同样的数据 (长表，带 地区 列)
+"""
+import sys
+import gzip
+import json
+import hashlib
+import argparse
+import threading
+import traceback
+from datetime import datetime
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import data_store
+import perf_trace
+
+# --- 配置区 ---
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8601
+RESPONSE_CACHE_ENTRIES = 256  # 缓存的响应条数，超出后淘汰最久未用的
+GZIP_MIN_BYTES = 1024         # 小于这个大小的响应不压缩
+JSON_TYPE = "application/json; charset=utf-8"
+ARROW_TYPE = "application/vnd.apache.arrow.stream"
+
+class QueryError(ValueError):
+    """查询参数有误，对应 HTTP 4xx；status 为状态码。"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+# =============================================================================
+#  查询：返回 (响应体 bytes, Content-Type)
+# =============================================================================
+def param_list(params, name):
+    """同一个参数既可以重复出现 (region=A&region=B)，也可以用逗号分隔 (region=A,B)。"""
+    return [item.strip() for value in params.get(name, []) for item in value.split(',') if item.strip()]
+
+def parse_month(value, name):
+    try:
+        return pd.Timestamp(pd.to_datetime(value, format='%Y-%m'))
+    except ValueError:
+        raise QueryError(f"参数 {name} 应为 YYYY-MM 格式: {value}")
+
+def to_json(payload):
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), JSON_TYPE
+
+def column_values(col, series):
+    """
+    数值列转为 JSON 列表，NaN 转为 null。比率列一律按存储时的 float32 精度输出 (7 位有效数字)，
+    不输出转换带来的尾数；/data 和 /latest 对同一个值给出同样的结果。
+    """
+    values = series.to_numpy()
+    if data_store.is_ratio_column(col):
+        return [None if np.isnan(v) else float(f"{v:.7g}") for v in values.astype(data_store.RATIO_DTYPE).tolist()]
+    return [None if np.isnan(v) else v for v in values.astype('float64').tolist()]
+
+def query_data(version, params):
+    regions = param_list(params, 'region')
+    if not regions:
+        raise QueryError("至少需要一个 region 参数")
+    stored = set(data_store.list_regions(version))
+    unknown = [region for region in regions if region not in stored]
+    if unknown:
+        raise QueryError(f"未知的地区: {', '.join(unknown)}", status=404)
+    output_format = params.get('format', ['json'])[0]
+    if output_format not in ('json', 'arrow'):
+        raise QueryError(f"format 只能是 json 或 arrow: {output_format}")
+    start = parse_month(params['start'][0], 'start') if 'start' in params else None
+    end = parse_month(params['end'][0], 'end') if 'end' in params else None
+
+    frames = {}
+    for region in regions:
+        df = data_store.load_region(region, version)
+        # 时间列总会返回，重复指定的列只取一次，否则会得到同名的重复列
+        if 'columns' in params:
+            columns = [col for col in dict.fromkeys(param_list(params, 'columns')) if col != '时间']
+        else:
+            columns = list(df.columns.drop('时间'))
+        missing = [col for col in columns if col not in df.columns]
+        if missing:
+            raise QueryError(f"未知的指标列: {', '.join(missing)}")
+        # 各地区已按时间升序存储，用二分查找定位时间范围，不逐行比较
+        times = df['时间'].to_numpy()
+        lo = np.searchsorted(times, start.to_datetime64()) if start is not None else 0
+        hi = np.searchsorted(times, end.to_datetime64(), side='right') if end is not None else len(df)
+        frames[region] = df.iloc[lo:hi][['时间'] + columns]
+
+    if output_format == 'arrow':
+        table = pa.concat_tables([
+            pa.Table.from_pandas(df.assign(地区=region)[['地区'] + list(df.columns)], preserve_index=False)
+            for region, df in frames.items()
+        ])
+        sink = pa.BufferOutputStream()
+        with ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes(), ARROW_TYPE
+
+    return to_json({
+        'version': version,
+        'regions': {region: {'时间': data_store.format_month(df['时间']).tolist(),
+                             **{col: column_values(col, df[col]) for col in df.columns.drop('时间')}}
+                    for region, df in frames.items()},
+    })
+
+def query_latest(version, params):
+    snapshot = data_store.load_latest_snapshot(version)
+    if snapshot is None:
+        snapshot = data_store.build_latest_snapshot(data_store.load_regions(version=version))
+    regions = param_list(params, 'region')
+    unknown = [region for region in regions if region not in snapshot.index]
+    if unknown:
+        raise QueryError(f"未知的地区: {', '.join(unknown)}", status=404)
+    if regions:
+        snapshot = snapshot.loc[regions]
+    # 数值列与 /data 用同样的转换；'_显示' 列是预先格式化好的字符串，原样返回
+    columns = {'时间': data_store.format_month(snapshot['时间']).tolist()}
+    for col in snapshot.columns.drop('时间'):
+        if pd.api.types.is_numeric_dtype(snapshot[col]):
+            columns[col] = column_values(col, snapshot[col])
+        else:
+            columns[col] = [None if pd.isna(v) else v for v in snapshot[col].tolist()]
+    rows = {region: {col: values[i] for col, values in columns.items()} for i, region in enumerate(snapshot.index)}
+    return to_json({'version': version, 'regions': rows})
+
+def query_columns(version, params):
+    regions = data_store.list_regions(version)
+    columns = list(data_store.load_region(regions[0], version).columns.drop('时间')) if regions else []
+    return to_json({'version': version, 'columns': columns})
+
+ROUTES = {
+    '/version': lambda version, params: to_json({'version': version}),
+    '/regions': lambda version, params: to_json({'version': version, 'regions': data_store.list_regions(version)}),
+    '/columns': query_columns,
+    '/latest': query_latest,
+    '/data': query_data,
+}
+
+# =============================================================================
+#  响应缓存：键为 (数据版本, 路径, 规范化后的查询参数)
+# =============================================================================
+class ResponseCache:
+    """线程安全的 LRU 缓存，保存响应体、gzip 压缩后的响应体和 ETag。"""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+def build_response(version, path, params):
+    body, content_type = ROUTES[path](version, params)
+    # ETag 取响应体的摘要。JSON 响应体里带有 version 字段，所以新版本发布后 ETag 都会变化；
+    # Arrow 响应不含版本号，数据没变时客户端复查仍然得到 304
+    etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+    compressed = gzip.compress(body, compresslevel=6) if len(body) >= GZIP_MIN_BYTES else None
+    return {'body': body, 'gzip': compressed, 'etag': etag, 'content_type': content_type}
+
+# =============================================================================
+#  HTTP 服务
+# =============================================================================
+class QueryHandler(BaseHTTPRequestHandler):
+    cache = ResponseCache()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path not in ROUTES:
+            self.send_json_error(404, f"没有这个接口: {url.path}")
+            return
+        version = data_store.read_version()
+        if version is None:
+            self.send_json_error(503, "存储中还没有数据")
+            return
+        params = parse_qs(url.query)
+        key = (version, url.path, tuple(sorted((name, tuple(values)) for name, values in params.items())))
+        with perf_trace.span("api.request", path=url.path):
+            entry = self.cache.get(key)
+            if entry is None:
+                try:
+                    entry = build_response(version, url.path, params)
+                except QueryError as e:
+                    self.send_json_error(e.status, str(e))
+                    return
+                except Exception:
+                    # 其他意外错误也要回一个 JSON 错误，不能让客户端只看到连接被断开；
+                    # 异常详情只写到服务端的标准错误输出，不返回给客户端
+                    print(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] 处理请求失败: {self.path}", file=sys.stderr, flush=True)
+                    traceback.print_exc()
+                    self.send_json_error(500, "服务器内部错误")
+                    return
+                self.cache.put(key, entry)
+            self.send_entry(entry)
+
+    def send_entry(self, entry):
+        if entry['etag'] in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+            self.send_response(304)
+            self.send_header("ETag", entry['etag'])
+            self.end_headers()
+            return
+        body = entry['body']
+        use_gzip = entry['gzip'] is not None and 'gzip' in self.headers.get('Accept-Encoding', '')
+        self.send_response(200)
+        self.send_header("Content-Type", entry['content_type'])
+        self.send_header("ETag", entry['etag'])
+        self.send_header("Cache-Control", "no-cache")  # 可以缓存，但每次都要用 ETag 复查
+        self.send_header("Vary", "Accept-Encoding")
+        if use_gzip:
+            body = entry['gzip']
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json_error(self, status, message):
+        body, content_type = to_json({'error': message})
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="海关数据只读查询接口")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    args = parser.parse_args()
+    server = ThreadingHTTPServer((args.host, args.port), QueryHandler)
+    print(f"查询接口: http://{args.host}:{args.port}/regions")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import os
+import re
+import csv
+import numpy as np
+import pandas as pd
+
+# --- 配置区 ---
+PARSER_VERSION = 3  # 解析规则变化时加一，已处理的数据会按新规则全部重建
+HEADER_ROWS = 3  # 单位行、指标行 (进出口/出口/进口)、口径行 (当月/1至X月)
+EXPECTED_UNIT = "万元"
+REGION_LABEL = "收发货人所在地"
+MONTH_LABEL = "当月"
+# 累计列的口径标签：'1至3月'、'1-2月' (1、2月合并发布)，1月份的表格里可能只写 '1月'
+CUMULATIVE_LABEL = re.compile(r'^1(?:[至\-－~]\d{1,2})?月$')
+VALUE_COLUMNS = ['进出口', '进口', '出口']
+# 海关公布的年初至今累计值 (指标, 1至X月)。以前月份的修订会体现在这里，不能用各月初值累加代替；
+# 表格里没有这一列时为空值，由 derived_metrics 退回到按当月值累加
+CUMULATIVE_COLUMNS = [flow + '_年初至今' for flow in VALUE_COLUMNS]
+NUMERIC_COLUMNS = VALUE_COLUMNS + CUMULATIVE_COLUMNS
+NA_VALUES = ['', '-', '--', '—', '…']
+
+class RawSchemaError(ValueError):
+    """原始CSV的表头与预期结构不符 (单位不对、找不到或找到多个指标列)，整份文件拒绝处理。"""
+
+# =============================================================================
+#  表头解析：按标签定位列，不依赖列的先后顺序
+# =============================================================================
+def read_header(file_path):
+    with open(file_path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        return [[cell.strip() for cell in next(reader, [])] for _ in range(HEADER_ROWS)]
+
+def resolve_columns(header_rows):
+    """
+    校验表头并返回 {'地区': 列序号, '进出口': 列序号, '进口': 列序号, '出口': 列序号, '进出口_年初至今': 列序号, ...}。
+    海关表格的表头有两层：指标行 (进出口/出口/进口/累计比去年同期±%) 和口径行 (当月/1至X月/...)，
+    取 (指标, '当月') 唯一对应的那一列。以前按位置取第 1/3/5 列，把排在第 3 列的出口数据当成了进口。
+    (指标, 1至X月) 累计列是可选的，没有时不出现在结果里，有多个时同样拒绝整份文件。
+    """
+    unit_row, flow_row, period_row = header_rows
+    units = {cell for cell in unit_row if cell}
+    if not units or not all(EXPECTED_UNIT in unit for unit in units):
+        raise RawSchemaError(f"表格单位不是{EXPECTED_UNIT}: {sorted(units)}")
+
+    columns = {}
+    region_cols = [i for i, label in enumerate(flow_row) if label == REGION_LABEL]
+    if not region_cols:
+        raise RawSchemaError(f"表头中没有 '{REGION_LABEL}' 列")
+    columns['地区'] = region_cols[0]
+
+    for flow in VALUE_COLUMNS:
+        matches = [i for i, (label, period) in enumerate(zip(flow_row, period_row))
+                   if label == flow and period == MONTH_LABEL]
+        if len(matches) != 1:
+            raise RawSchemaError(f"表头中 ({flow}, {MONTH_LABEL}) 列有 {len(matches)} 个，应当恰好 1 个")
+        columns[flow] = matches[0]
+
+        cumulative = [i for i, (label, period) in enumerate(zip(flow_row, period_row))
+                      if label == flow and CUMULATIVE_LABEL.match(period)]
+        if len(cumulative) > 1:
+            raise RawSchemaError(f"表头中 ({flow}, 1至X月) 列有 {len(cumulative)} 个，最多 1 个")
+        if cumulative:
+            columns[flow + '_年初至今'] = cumulative[0]
+    return columns
+
+# =============================================================================
+#  数据行解析
+# =============================================================================
+def month_of_file(file_path):
+    """从 'YYYY-MM.csv' 文件名解析出对应月份的时间戳 (月初)。"""
+    year, month = map(int, os.path.basename(file_path).replace('.csv', '').split('-'))
+    return pd.Timestamp(year=year, month=month, day=1)
+
+def read_values(file_path, columns):
+    """
+    只读取需要的列 (地区、三个当月值、表格里有的累计值)，数值列直接按 float64 解析。
+    返回 (数据框, 无法解析的行的布尔掩码)；全部单元格都是合法数字时掩码为 None。
+    表格里没有的累计列补为空值。
+    """
+    names = {index: name for name, index in columns.items()}
+    numeric = [col for col in NUMERIC_COLUMNS if col in columns]
+    read_kwargs = dict(header=None, skiprows=HEADER_ROWS, usecols=list(names), encoding='utf-8-sig',
+                       na_values=NA_VALUES, thousands=',', skip_blank_lines=False)
+    value_dtypes = {columns[col]: 'float64' for col in numeric}
+    try:
+        df = pd.read_csv(file_path, dtype={columns['地区']: str, **value_dtypes}, **read_kwargs).rename(columns=names)
+        invalid = None
+    except ValueError:
+        # 少见情况：有单元格不是数字 (比如脚注符号)。按字符串重读一次，只用来定位这些行
+        df = pd.read_csv(file_path, dtype=str, **read_kwargs).rename(columns=names)
+        invalid = pd.Series(False, index=df.index)
+        for col in numeric:
+            parsed = pd.to_numeric(df[col].str.replace(',', '', regex=False), errors='coerce')
+            invalid |= parsed.isna() & df[col].notna()
+            df[col] = parsed.astype('float64')
+    for col in CUMULATIVE_COLUMNS:
+        if col not in df.columns:
+            df[col] = np.nan
+    return df, invalid
+
+def parse_raw_csv(file_path, locations=None):
+    """
+    解析单个月份的原始CSV，返回 (数据框, 被拒绝的行)。
+    数据框的列为 地区 / 进出口 / 进口 / 出口 / 进出口_年初至今 / 进口_年初至今 / 出口_年初至今 / 时间，
+    累计列取海关公布的 (指标, 1至X月) 值，表格里没有时为空值。
+    默认保留表格中的全部地区，传入 locations 时只保留这些地区。
+    被拒绝的行是 [{'行号', '地区', '原因'}] 列表，行号是CSV文件中的行号 (从1开始)；完全空白的行不计入。
+    表头不符合预期时抛出 RawSchemaError。
+    """
+    columns = resolve_columns(read_header(file_path))
+    df, invalid = read_values(file_path, columns)
+    df['地区'] = df['地区'].str.strip()
+
+    no_region = df['地区'].isna() | (df['地区'] == '')
+    no_values = df[VALUE_COLUMNS].isna().all(axis=1)
+    blank = no_region & no_values
+    if invalid is None:
+        invalid = pd.Series(False, index=df.index)
+    duplicated = ~no_region & df['地区'].duplicated()
+
+    reasons = [
+        (invalid & ~blank, "数值无法解析"),
+        (no_region & ~no_values & ~invalid, "缺少地区名称"),
+        (~no_region & no_values & ~invalid, "没有数值"),  # 表格末尾的注释、说明行
+        (duplicated & ~no_values & ~invalid, "地区重复"),
+    ]
+    rejected = []
+    rejected_mask = blank.copy()
+    for mask, reason in reasons:
+        for index in df.index[mask]:
+            region = df.at[index, '地区']
+            rejected.append({'行号': int(index) + HEADER_ROWS + 1, '地区': '' if pd.isna(region) else region, '原因': reason})
+        rejected_mask |= mask
+    rejected.sort(key=lambda row: row['行号'])
+
+    df = df[~rejected_mask]
+    if locations is not None:
+        df = df[df['地区'].isin(locations)]
+    df = df[['地区'] + NUMERIC_COLUMNS].reset_index(drop=True)
+    df['时间'] = month_of_file(file_path)
+    return df, rejected
+
+def parse_raw_arrays(file_path, locations=None):
+    """
+    供进程池调用的解析入口：返回 (月份, 地区数组, n×6 的 float64 数值矩阵 (列同 NUMERIC_COLUMNS), 被拒绝的行)。
+    跨进程只传这几个紧凑数组，比传整个数据框的序列化开销小得多。
+    """
+    df, rejected = parse_raw_csv(file_path, locations)
+    return month_of_file(file_path), df['地区'].to_numpy(dtype=object), df[NUMERIC_COLUMNS].to_numpy(dtype='float64'), rejected
@@ -0,0 +1,248 @@
+"""
+后台数据刷新程序：抓取新数据 -> 增量处理 -> 原子地发布到列式存储。
+
+与 Streamlit 看板完全解耦，看板只读取存储里的版本号来决定是否重新加载数据。
+用法：
+    python refresh_worker.py --once              # 立即刷新一次
+    python refresh_worker.py --interval 360      # 每 360 分钟刷新一次
+    python refresh_worker.py --at 09:30          # 每天 09:30 刷新一次
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from datetime import datetime, timedelta
+import data_store
+import perf_trace
+import region_catalog
+
+# --- 配置区 ---
+RAW_DATA_PATH = "raw_csv_data"
+OUTPUT_FILENAME = "海关统计数据汇总.xlsx"
+EXPORT_EXCEL = True  # Excel 报告只导出 regions.json 中配置的地区，列式存储保存全部地区
+CRAWL_CONCURRENCY = 3
+CRAWL_MIN_INTERVAL = 1.0
+LOCK_FILE = "refresh.lock"
+STATUS_FILE = "refresh_status.json"
+LOCK_STALE_SECONDS = 2 * 60 * 60  # 锁文件里读不到进程号时，超过这个时间仍未释放视为异常退出留下的
+
+# =============================================================================
+#  跨进程刷新锁：保证任意时刻只有一个刷新在运行
+# =============================================================================
+class RefreshLock:
+    """
+    用 O_EXCL 创建锁文件实现的跨进程锁，Windows 和 Linux 下行为一致。
+    锁文件里记录持有者的进程号：进程还活着锁就有效，不管刷新跑了多久；进程已退出则视为过期。
+    """
+
+    def __init__(self, path=LOCK_FILE, stale_seconds=LOCK_STALE_SECONDS):
+        self.path = path
+        self.stale_seconds = stale_seconds
+        self.acquired = False
+
+    def acquire(self):
+        if os.path.exists(self.path) and not is_refresh_running(self.path, self.stale_seconds):
+            # 过期的锁文件：上次刷新被强行终止，直接清理；另一个进程可能抢先清理掉了
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+        try:
+            fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w') as f:
+            f.write(str(os.getpid()))
+        self.acquired = True
+        return True
+
+    def release(self):
+        if self.acquired:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.acquired = False
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+def read_lock_pid(lock_path):
+    """读取锁文件里的进程号；文件刚创建还没写入或内容损坏时返回 None。"""
+    try:
+        with open(lock_path, 'r', encoding='utf-8') as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+def pid_alive(pid):
+    if sys.platform == 'win32':
+        # Windows 下 os.kill 会直接结束进程，只能通过进程句柄查询退出码
+        import ctypes
+        PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+        STILL_ACTIVE = 259
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return False
+        try:
+            exit_code = ctypes.c_ulong()
+            return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))) and exit_code.value == STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # 进程存在，只是属于其他用户
+        return True
+    return True
+
+def is_refresh_running(lock_path=LOCK_FILE, stale_seconds=LOCK_STALE_SECONDS):
+    try:
+        age = time.time() - os.path.getmtime(lock_path)
+    except OSError:
+        return False
+    pid = read_lock_pid(lock_path)
+    if pid is None:
+        # 读不到进程号 (刚创建还没写入，或旧版本留下的锁)，只能按修改时间判断
+        return age < stale_seconds
+    return pid_alive(pid)
+
+def write_status(**status):
+    tmp_path = STATUS_FILE + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(status, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, STATUS_FILE)
+
+def read_status():
+    try:
+        with open(STATUS_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+# =============================================================================
+#  刷新流程
+# =============================================================================
+def process_raw_data(log=print):
+    """增量处理原始CSV并发布新版本；原始数据没有变化时返回 None，否则返回新版本号。"""
+    metrics, changed_months, errors = data_store.refresh_processed_store(RAW_DATA_PATH)
+    for file_path, e in errors:
+        log(f"处理文件 {file_path} 时出错: {e}")
+    rejected = data_store.rejected_rows_report()
+    if not rejected.empty:
+        log(f"{rejected['文件'].nunique()} 个原始文件中共有 {len(rejected)} 行被拒绝，明细记录在 {data_store.MANIFEST_FILE}")
+    if metrics is None:
+        log("未能处理任何数据。")
+        return None
+    if not changed_months and data_store.store_exists():
+        log("原始数据没有变化，无需发布新版本。")
+        return None
+
+    frames_by_location = data_store.build_region_frames(metrics)
+    version = data_store.write_store(frames_by_location)
+    if EXPORT_EXCEL:
+        configured = region_catalog.configured_regions(region_catalog.load_catalog())
+        data_store.export_excel({loc: frames_by_location[loc] for loc in configured if loc in frames_by_location},
+                                OUTPUT_FILENAME)
+    log(f"本次更新涉及 {len(changed_months)} 个月份，已发布数据版本 {version}")
+    return version
+
+def run_refresh(log=print):
+    """执行一次完整刷新；已有刷新在运行时直接返回 False，不会重复抓取。"""
+    # 抓取相关的依赖只在真正刷新时导入：看板导入本模块只是为了 start_background_refresh / is_refresh_running
+    import crawler
+
+    lock = RefreshLock()
+    if not lock.acquire():
+        log("已有刷新任务正在运行，跳过本次刷新。")
+        return False
+    started_at = datetime.now().isoformat(timespec='seconds')
+    try:
+        write_status(state="running", started_at=started_at)
+        with perf_trace.span("refresh.crawl"):
+            downloaded, errors = crawler.run_crawl(
+                RAW_DATA_PATH, CRAWL_CONCURRENCY, CRAWL_MIN_INTERVAL,
+                on_progress=lambda message, fraction=None: log(message),
+            )
+        for task, e in errors:
+            log(f"处理 {task} 时出错: {e}")
+        log(f"新下载 {len(downloaded)} 个文件。")
+        with perf_trace.span("refresh.process"):
+            version = process_raw_data(log)
+        write_status(state="finished", started_at=started_at,
+                     finished_at=datetime.now().isoformat(timespec='seconds'),
+                     downloaded=len(downloaded), errors=len(errors), version=version)
+        return True
+    except Exception as e:
+        write_status(state="failed", started_at=started_at,
+                     finished_at=datetime.now().isoformat(timespec='seconds'), error=str(e))
+        raise
+    finally:
+        lock.release()
+
+def start_background_refresh():
+    """
+    供看板调用：在独立进程中启动一次刷新，立即返回，不阻塞 Streamlit 脚本。
+    已有刷新在运行时返回 False；多个观众同时点击时，刷新锁保证最终只有一个进程真正抓取。
+    """
+    if is_refresh_running():
+        return False
+    kwargs = {}
+    if sys.platform == 'win32':
+        kwargs['creationflags'] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs['start_new_session'] = True
+    subprocess.Popen([sys.executable, os.path.abspath(__file__), "--once"],
+                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, **kwargs)
+    return True
+
+# =============================================================================
+#  调度
+# =============================================================================
+def next_daily_run(at_time, now=None):
+    now = now or datetime.now()
+    hour, minute = map(int, at_time.split(":"))
+    run_at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if run_at <= now:
+        run_at += timedelta(days=1)
+    return run_at
+
+def main():
+    parser = argparse.ArgumentParser(description="海关数据后台刷新程序")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--once", action="store_true", help="立即刷新一次后退出")
+    group.add_argument("--interval", type=float, metavar="MINUTES", help="每隔指定分钟数刷新一次")
+    group.add_argument("--at", metavar="HH:MM", help="每天在指定时间刷新一次")
+    args = parser.parse_args()
+
+    def log(message):
+        print(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] {message}", flush=True)
+
+    if args.once:
+        run_refresh(log)
+        return
+
+    # --interval 启动后立即刷新一次；--at 等到指定时间再刷新
+    run_at = datetime.now() if args.interval else next_daily_run(args.at)
+    while True:
+        log(f"下一次刷新时间: {run_at:%Y-%m-%d %H:%M}")
+        time.sleep(max(0, (run_at - datetime.now()).total_seconds()))
+        try:
+            run_refresh(log)
+        except Exception as e:
+            log(f"刷新失败: {e}")
+        if args.interval:
+            run_at = datetime.now() + timedelta(minutes=args.interval)
+        else:
+            run_at = next_daily_run(args.at)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import json
+
+# --- 配置区 ---
+# 看板展示哪些地区、省份下有哪些地市，都由这个配置文件决定；
+# 数据存储里保存的是海关表格中的全部地区，修改配置不需要重新抓取或处理数据
+REGION_CATALOG_FILE = "regions.json"
+DEFAULT_CATALOG = {
+    "overview": ["全国", "北京市", "上海市", "深圳市", "南京市", "合肥市", "浙江省"],
+    "hierarchy": {"浙江省": ["杭州市", "宁波市", "温州市", "湖州市", "金华市", "台州市"]},
+    "default": "浙江省",
+}
+
+def load_catalog(path=REGION_CATALOG_FILE):
+    """读取地区配置，文件不存在时使用内置的默认配置。"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            catalog = json.load(f)
+    except FileNotFoundError:
+        return dict(DEFAULT_CATALOG)
+    return {**DEFAULT_CATALOG, **catalog}
+
+def overview_regions(catalog):
+    """概览区域展示的地区 (包括全国)。"""
+    return list(catalog["overview"])
+
+def sub_regions(catalog, region):
+    """省份下属的地市，没有配置时返回空列表。"""
+    return list(catalog["hierarchy"].get(region, []))
+
+def configured_regions(catalog):
+    """配置中出现的全部地区：概览地区在前，每个省份的地市紧随其后，去重并保持顺序。"""
+    regions = []
+    for region in catalog["overview"]:
+        regions.append(region)
+        regions.extend(catalog["hierarchy"].get(region, []))
+    for cities in catalog["hierarchy"].values():
+        regions.extend(cities)
+    return list(dict.fromkeys(regions))
+
+def default_region(catalog):
+    return catalog.get("default") or catalog["overview"][0]
+
+def selectable_regions(catalog, stored_regions):
+    """侧边栏可选的地区：配置中的地区在前，存储中其余的地区按名称排在后面。"""
+    configured = configured_regions(catalog)
+    return configured + sorted(set(stored_regions) - set(configured))
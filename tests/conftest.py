@@ -0,0 +1,13 @@
+import os
+import sys
+import pytest
+
+# 项目是平铺的顶层模块，测试直接按模块名导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import perf_trace
+
+@pytest.fixture(autouse=True)
+def no_perf_trace(monkeypatch):
+    """测试中不向工作目录写 perf_trace.jsonl。"""
+    monkeypatch.setattr(perf_trace, "TRACE_ENABLED", False)
@@ -0,0 +1,75 @@
+"""
+抓取任务日志：待处理/失败/完成的状态流转、跨运行的退避，以及同一次运行内的重试。
+"""
+import pytest
+import crawl_journal
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = crawl_journal.CrawlJournal(str(tmp_path / "journal.sqlite"))
+    yield journal
+    journal.close()
+
+def test_failed_task_waits_for_backoff(journal):
+    journal.add_tasks([(2024, 2, "u2"), (2024, 1, "u1")])
+    assert journal.due_tasks() == [(2024, 1, "u1"), (2024, 2, "u2")]
+
+    journal.mark_done(2024, 1)
+    journal.mark_failed(2024, 2, RuntimeError("503"))
+    assert journal.due_tasks() == []
+    # 第一次失败后至少等待 BACKOFF_BASE_SECONDS 秒
+    now = crawl_journal.time.time()
+    assert journal.due_tasks(now + crawl_journal.BACKOFF_BASE_SECONDS - 5) == []
+    assert journal.due_tasks(now + crawl_journal.BACKOFF_BASE_SECONDS + 5) == [(2024, 2, "u2")]
+    assert journal.summary() == {crawl_journal.DONE: 1, crawl_journal.FAILED: 1}
+
+def test_task_gives_up_after_max_attempts_until_reset(journal):
+    journal.add_tasks([(2024, 3, "u3")])
+    for _ in range(crawl_journal.MAX_ATTEMPTS):
+        journal.mark_failed(2024, 3, RuntimeError("timeout"))
+    far_future = crawl_journal.time.time() + 10 * crawl_journal.BACKOFF_MAX_SECONDS
+    assert journal.due_tasks(far_future) == []
+
+    journal.reset_failed()
+    assert journal.due_tasks() == [(2024, 3, "u3")]
+
+def test_done_task_is_pending_again_when_file_is_missing(journal):
+    journal.add_tasks([(2024, 1, "u1")])
+    journal.mark_done(2024, 1)
+    assert journal.due_tasks() == []
+    # 本地文件又不见了，调用方会把这个月份重新登记
+    journal.add_tasks([(2024, 1, "u1-new")])
+    assert journal.due_tasks() == [(2024, 1, "u1-new")]
+
+def test_backoff_is_capped():
+    assert crawl_journal.backoff_seconds(1) == crawl_journal.BACKOFF_BASE_SECONDS
+    assert crawl_journal.backoff_seconds(2) == 2 * crawl_journal.BACKOFF_BASE_SECONDS
+    assert crawl_journal.backoff_seconds(100) == crawl_journal.BACKOFF_MAX_SECONDS
+
+def test_retry_call_retries_then_gives_up():
+    calls = []
+
+    def flaky(value):
+        calls.append(value)
+        if len(calls) < 3:
+            raise ConnectionError("reset")
+        return value
+
+    assert crawl_journal.retry_call(flaky, "ok", retries=3, delay=0) == "ok"
+    assert len(calls) == 3
+
+    calls.clear()
+    with pytest.raises(ConnectionError):
+        crawl_journal.retry_call(flaky, "x", retries=1, delay=0)
+    assert len(calls) == 2
+
+def test_retry_call_does_not_retry_listed_errors():
+    calls = []
+
+    def gated():
+        calls.append(1)
+        raise LookupError("gated")
+
+    with pytest.raises(LookupError):
+        crawl_journal.retry_call(gated, retries=3, delay=0, no_retry=(LookupError,))
+    assert calls == [1]
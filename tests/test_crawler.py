@@ -0,0 +1,43 @@
+"""
+浏览器抓取路径中不依赖 Playwright 的部分：详情页表格解析，以及没有表格时的失败处理。
+"""
+import asyncio
+import pytest
+import crawler
+
+class FakePage:
+    """只实现 fetch_month_table 用到的几个 Playwright 页面方法，内容固定为 container_html。"""
+
+    def __init__(self, container_html):
+        self.container_html = container_html
+
+    async def goto(self, url, timeout=None):
+        pass
+
+    async def wait_for_selector(self, selector, timeout=None):
+        pass
+
+    def locator(self, selector):
+        return self
+
+    async def inner_html(self):
+        return self.container_html
+
+TABLE_HTML = ("<table><tr><td>单位：万元</td><td>单位：万元</td></tr>"
+              "<tr><td>收发货人所在地</td><td>进出口</td></tr>"
+              "<tr><td>收发货人所在地</td><td>当月</td></tr>"
+              "<tr><td>全国</td><td>608169</td></tr></table>")
+
+def fetch(container_html):
+    return asyncio.run(crawler.fetch_month_table(FakePage(container_html), crawler.HostRateLimiter(0), "http://x/detail"))
+
+def test_fetch_month_table_parses_the_container():
+    df = fetch(TABLE_HTML)
+    assert df.shape == (2, 2)
+    assert df.iloc[-1].tolist() == ['全国', '608169']
+
+def test_page_without_table_is_a_failure():
+    # 没有表格必须抛出异常，任务日志才会记为失败待重试，而不是记为完成
+    assert crawler.parse_table_html("<p>页面维护中</p>") is None
+    with pytest.raises(ValueError):
+        fetch("<p>页面维护中</p>")
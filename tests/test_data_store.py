@@ -0,0 +1,73 @@
+"""
+版本化存储：原子发布的 CURRENT 指针、按版本读取，以及旧版本的清理。
+"""
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import data_store
+import derived_metrics
+
+def region_frames(seed=0, months=pd.date_range("2024-01-01", "2025-02-01", freq="MS")):
+    rng = np.random.default_rng(seed)
+    rows = [(region, month) for month in months for region in ('全国', '浙江省', '江苏省')]
+    master = pd.DataFrame(rows, columns=['地区', '时间'])
+    for flow in derived_metrics.FLOWS:
+        master[flow] = rng.uniform(1e5, 1e6, len(master)).round()
+    return derived_metrics.MetricCube.from_frame(master).region_frames()
+
+@pytest.fixture
+def store(tmp_path):
+    return str(tmp_path / "store")
+
+def test_publish_moves_pointer_and_keeps_pinned_version_readable(store):
+    assert data_store.read_version(store) is None
+    first = data_store.write_store(region_frames(seed=0), store)
+    second = data_store.write_store(region_frames(seed=1), store)
+
+    assert data_store.read_version(store) == second
+    assert data_store.list_versions(store) == [first, second]
+    assert data_store.version_exists(first, store)
+    # 固定在旧版本上的读者读到的仍然是旧版本的数据
+    old = data_store.load_region('全国', first, store)
+    new = data_store.load_region('全国', store_path=store)
+    pd.testing.assert_frame_equal(old, region_frames(seed=0)['全国'], check_dtype=False, rtol=1e-6)
+    pd.testing.assert_frame_equal(new, region_frames(seed=1)['全国'], check_dtype=False, rtol=1e-6)
+    assert data_store.list_regions(first, store) == ['全国', '江苏省', '浙江省']
+
+def test_old_versions_are_kept_during_grace_period(store):
+    versions = [data_store.write_store(region_frames(), store)
+                for _ in range(data_store.KEEP_VERSIONS + 2)]
+    # 发布时用默认的宽限期清理：刚被替换下来的版本都还在
+    assert data_store.list_versions(store) == versions
+
+    data_store.collect_old_versions(store, grace_seconds=0)
+    assert data_store.list_versions(store) == versions[-data_store.KEEP_VERSIONS:]
+
+def test_current_version_is_never_collected(store):
+    versions = [data_store.write_store(region_frames(), store)
+                for _ in range(data_store.KEEP_VERSIONS + 1)]
+    # 指针指向最早的版本 (比如回滚) 时，它不会因为超出保留数量被删掉
+    with open(os.path.join(store, data_store.CURRENT_FILENAME), 'w', encoding='utf-8') as f:
+        f.write(versions[0])
+    data_store.collect_old_versions(store, grace_seconds=0)
+    assert data_store.list_versions(store) == versions
+    assert data_store.read_version(store) == versions[0]
+
+def test_interrupted_writes_and_legacy_layout_are_cleaned_up(store):
+    # 旧版单目录布局：版本号在根目录的 _version 里，读取仍然可用
+    legacy_partition = os.path.join(store, "地区=全国", "年份=2024")
+    os.makedirs(legacy_partition)
+    with open(os.path.join(store, data_store.VERSION_FILENAME), 'w', encoding='utf-8') as f:
+        f.write("legacy")
+    assert data_store.read_version(store) == "legacy"
+
+    version = data_store.write_store(region_frames(), store)
+    leftover = os.path.join(store, data_store.VERSIONS_DIRNAME, "20000101000000000000.tmp")
+    os.makedirs(leftover)
+    data_store.collect_old_versions(store, grace_seconds=0)
+
+    assert not os.path.exists(leftover)
+    assert not os.path.exists(os.path.join(store, "地区=全国"))
+    assert not os.path.exists(os.path.join(store, data_store.VERSION_FILENAME))
+    assert data_store.read_version(store) == version
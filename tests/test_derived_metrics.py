@@ -0,0 +1,106 @@
+"""
+派生指标：年初至今优先采用海关公布的累计值；增量更新 (MetricCube.update) 必须与全量重建 (MetricCube.from_frame) 结果一致。
+"""
+import numpy as np
+import pandas as pd
+import pytest
+import derived_metrics
+
+REPORTED_COLUMNS = [flow + derived_metrics.REPORTED_YTD_SUFFIX for flow in derived_metrics.FLOWS]
+
+def master_frame(months, regions=('全国', '浙江省', '江苏省'), seed=0, reported=True):
+    """
+    当月值随机生成。reported 为 True 时附带公布的累计列：在当月值累加的基础上略微上调，
+    模拟以前月份发布后被修订、只体现在公布累计值里的情况。
+    """
+    rng = np.random.default_rng(seed)
+    rows = [(region, month) for month in months for region in regions]
+    df = pd.DataFrame(rows, columns=['地区', '时间'])
+    for flow in derived_metrics.FLOWS:
+        df[flow] = rng.uniform(1e5, 1e6, len(df)).round()
+    if reported:
+        running = df.groupby(['地区', df['时间'].dt.year])[derived_metrics.FLOWS].cumsum()
+        df[REPORTED_COLUMNS] = (running * 1.003).round().to_numpy()
+    return df
+
+def ytd_series(cube, region, flow='进出口'):
+    return pd.Series(cube.metrics['_年初至今'][derived_metrics.FLOWS.index(flow), cube.regions.get_loc(region)],
+                     index=cube.months)
+
+def assert_same_metrics(updated, rebuilt):
+    assert list(updated.regions) == list(rebuilt.regions)
+    assert list(updated.months) == list(rebuilt.months)
+    for suffix, expected in rebuilt.metrics.items():
+        np.testing.assert_allclose(updated.metrics[suffix], expected, rtol=1e-12, equal_nan=True, err_msg=suffix)
+
+MONTHS = pd.date_range("2021-01-01", "2024-06-01", freq="MS")
+
+def test_ytd_uses_reported_cumulative_values():
+    master = master_frame(MONTHS)
+    cube = derived_metrics.MetricCube.from_frame(master)
+    reported = master[master['地区'] == '浙江省'].set_index('时间')['进出口_年初至今']
+    pd.testing.assert_series_equal(ytd_series(cube, '浙江省'), reported, check_names=False, check_freq=False)
+    # 同比也基于公布的累计值
+    yoy = cube.metrics['_年初至今同比'][0, cube.regions.get_loc('浙江省')]
+    assert yoy[-1] == pytest.approx(reported.iloc[-1] / reported.iloc[-13] - 1)
+
+def test_ytd_falls_back_to_running_sum_without_reported_values():
+    master = master_frame(MONTHS)
+    gap = pd.Timestamp("2024-03-01")
+    master.loc[master['时间'] == gap, REPORTED_COLUMNS] = np.nan
+    ytd = ytd_series(derived_metrics.MetricCube.from_frame(master), '江苏省')
+    rows = master[master['地区'] == '江苏省'].set_index('时间')
+    # 缺公布值的月份 = 上月累计 + 当月值，下个月又回到公布值
+    assert ytd[gap] == rows.loc["2024-02-01", '进出口_年初至今'] + rows.loc[gap, '进出口']
+    assert ytd["2024-04-01"] == rows.loc["2024-04-01", '进出口_年初至今']
+
+    # 完全没有累计列的旧表格：按当月值逐年累加
+    plain = master_frame(MONTHS, reported=False)
+    ytd = ytd_series(derived_metrics.MetricCube.from_frame(plain), '江苏省')
+    rows = plain[plain['地区'] == '江苏省'].set_index('时间')['进出口']
+    pd.testing.assert_series_equal(ytd, rows.groupby(rows.index.year).cumsum(), check_names=False, check_freq=False)
+
+@pytest.mark.parametrize("reported", [True, False])
+def test_ytd_with_combined_january_february_release(reported):
+    # 2024 年 1、2 月合并发布，没有单独的 1 月数据
+    master = master_frame(MONTHS, reported=reported)
+    master = master[master['时间'] != pd.Timestamp("2024-01-01")]
+    ytd = ytd_series(derived_metrics.MetricCube.from_frame(master), '全国')
+    year = ytd["2024-02-01":]
+    if reported:
+        expected = master[master['地区'] == '全国'].set_index('时间').loc["2024-02-01":, '进出口_年初至今']
+        pd.testing.assert_series_equal(year, expected, check_names=False, check_freq=False)
+    else:
+        # 没有公布值时无法得到正确的累计，宁可为空也不给出偏小的数
+        assert year.isna().all()
+
+@pytest.mark.parametrize("reported", [True, False])
+def test_metric_cube_update_after_revision(reported):
+    master = master_frame(MONTHS, reported=reported)
+    cube = derived_metrics.MetricCube.from_frame(master)
+    revised_month = pd.Timestamp("2023-02-01")
+    revised = master.copy()
+    rows = revised['时间'] == revised_month
+    revised.loc[rows, [col for col in revised.columns if col not in ('地区', '时间')]] *= 1.1
+
+    assert cube.update(revised, {revised_month})
+    assert_same_metrics(cube, derived_metrics.MetricCube.from_frame(revised))
+
+@pytest.mark.parametrize("reported", [True, False])
+def test_metric_cube_update_after_backfill(reported):
+    missing_month = pd.Timestamp("2022-07-01")
+    master = master_frame(MONTHS, reported=reported)
+    cube = derived_metrics.MetricCube.from_frame(master[master['时间'] != missing_month])
+
+    assert cube.update(master, {missing_month})
+    assert_same_metrics(cube, derived_metrics.MetricCube.from_frame(master))
+
+@pytest.mark.parametrize("reported", [True, False])
+def test_metric_cube_update_after_new_month(reported):
+    master = master_frame(MONTHS, reported=reported)
+    new_month = pd.Timestamp("2024-07-01")
+    extended = pd.concat([master, master_frame([new_month], seed=1, reported=reported)], ignore_index=True)
+    cube = derived_metrics.MetricCube.from_frame(master)
+
+    assert cube.update(extended, {new_month})
+    assert_same_metrics(cube, derived_metrics.MetricCube.from_frame(extended))
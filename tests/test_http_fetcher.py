@@ -0,0 +1,166 @@
+"""
+静态HTTP抓取：用本地 http.server 提供录制的海关页面，不访问外网。
+"""
+import os
+import threading
+import functools
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+import pytest
+import crawl_journal
+import http_fetcher
+import raw_parser
+from http_cache import HttpCache
+
+# =============================================================================
+#  录制的页面：总索引页 -> 年份页 -> 各月详情页
+# =============================================================================
+INDEX_PAGE = """<html><body>
+<a href="y2024.html">2024年</a><a href="y2025.html">2025年</a>
+<div class="customs-foot"></div>
+</body></html>"""
+
+YEAR_2024_PAGE = """<html><body><table>
+<tr><td>进出口商品收发货人所在地总值表</td>
+<td><a href="detail.html?m=1">1月</a><a href="detail.html?m=2">2月</a><a href="late.html?m=3">3月</a></td></tr>
+</table></body></html>"""
+
+# 反爬挑战页：没有预期的表格，只有一段脚本
+GATED_PAGE = """<html><head><script>document.cookie = "challenge=1"; location.reload();</script></head></html>"""
+
+# 详情页的表头和真实页面一样有三行；出口排在进口前面
+DETAIL_HEADER = [
+    ["单位：万元"] * 7,
+    ["收发货人所在地", "进出口", "进出口", "出口", "出口", "进口", "进口"],
+    ["收发货人所在地", "当月", "1至3月", "当月", "1至3月", "当月", "1至3月"],
+]
+DETAIL_ROWS = [
+    ["全国", "608169", "3009486", "502402", "1783422", "105767", "1226064"],
+    ["浙江省", "1130999", "3592920", "425726", "1390299", "705273", "2202621"],
+]
+
+def detail_page(rows=DETAIL_ROWS):
+    cells = "".join("<tr>" + "".join(f"<td>{cell}</td>" for cell in row) + "</tr>" for row in DETAIL_HEADER + rows)
+    return f'<html><body><div class="easysite-news-text"><table>{cells}</table></div></body></html>'
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def site(tmp_path):
+    """在本地端口上提供录制页面的目录，返回 (目录, 总索引页URL)。late.html 一开始不存在 (404)。"""
+    root = tmp_path / "site"
+    root.mkdir()
+    pages = {"index.html": INDEX_PAGE, "y2024.html": YEAR_2024_PAGE, "y2025.html": GATED_PAGE,
+             "detail.html": detail_page()}
+    for name, text in pages.items():
+        (root / name).write_text(text, encoding='utf-8')
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=str(root)))
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield root, f"http://127.0.0.1:{server.server_address[1]}/index.html"
+    server.shutdown()
+    server.server_close()
+
+# =============================================================================
+#  静态抓取 + 任务日志
+# =============================================================================
+def test_fetch_new_months_with_journal(site, tmp_path, monkeypatch):
+    root, base_url = site
+    # 404 会在同一次运行内按指数退避重试，测试里不真的等待
+    monkeypatch.setattr(crawl_journal.time, "sleep", lambda seconds: None)
+    raw_path = tmp_path / "raw"
+    raw_path.mkdir()
+    journal = crawl_journal.CrawlJournal(str(tmp_path / "journal.sqlite"))
+    fetcher = http_fetcher.StaticFetcher(base_url, pool_size=2, min_interval=0, cache=None)
+
+    downloaded, errors, gated_years, gated_tasks = http_fetcher.fetch_new_months(
+        fetcher, str(raw_path), set(), [2024, 2025], journal=journal)
+
+    assert sorted(os.path.basename(path) for path in downloaded) == ["2024-01.csv", "2024-02.csv"]
+    assert [label for label, _ in errors] == ["2024年3月"]
+    assert gated_years == [2025] and gated_tasks == []
+    assert journal.summary() == {crawl_journal.DONE: 2, crawl_journal.FAILED: 1}
+
+    # 下载的文件能被解析，出口/进口各取自自己的 '当月' 列
+    df, rejected = raw_parser.parse_raw_csv(downloaded[0])
+    assert rejected == []
+    national = df.set_index('地区').loc['全国']
+    assert (national['进出口'], national['出口'], national['进口']) == (608169, 502402, 105767)
+
+    # 失败的月份还在退避期内：页面已经可以访问，这次运行也不会请求它
+    (root / "late.html").write_text(detail_page(), encoding='utf-8')
+    existing = set(os.listdir(raw_path))
+    fetcher = http_fetcher.StaticFetcher(base_url, pool_size=2, min_interval=0, cache=None)
+    downloaded, errors, _, _ = http_fetcher.fetch_new_months(fetcher, str(raw_path), existing, [2024], journal=journal)
+    assert downloaded == [] and errors == []
+
+    # 人工放行后重试成功
+    journal.reset_failed()
+    fetcher = http_fetcher.StaticFetcher(base_url, pool_size=2, min_interval=0, cache=None)
+    downloaded, errors, _, _ = http_fetcher.fetch_new_months(fetcher, str(raw_path), existing, [2024], journal=journal)
+    assert [os.path.basename(path) for path in downloaded] == ["2024-03.csv"] and errors == []
+    assert journal.summary() == {crawl_journal.DONE: 3}
+    journal.close()
+
+def test_static_fetcher_reports_js_gate(site):
+    _, base_url = site
+    fetcher = http_fetcher.StaticFetcher(base_url, pool_size=1, min_interval=0, cache=None)
+    month_links, changed = fetcher.month_links(2024)
+    assert [month for month, _ in month_links] == [1, 2, 3] and changed
+    with pytest.raises(http_fetcher.JsGatedError):
+        fetcher.month_links(2025)
+
+# =============================================================================
+#  修订窗口：原URL上重新发布的表格，年份页面不变也要能发现
+# =============================================================================
+def revise_page(path, rows):
+    """改写页面内容，并把修改时间往后拨，服务器不会因为 If-Modified-Since 返回 304。"""
+    mtime = os.path.getmtime(path)
+    path.write_text(detail_page(rows), encoding='utf-8')
+    os.utime(path, (mtime + 60, mtime + 60))
+
+REVISED_ROWS = [["全国", "608170", "3009487", "502403", "1783423", "105767", "1226064"]] + DETAIL_ROWS[1:]
+
+@pytest.fixture
+def crawled(site, tmp_path):
+    """三个月份都已下载、页面都已缓存的状态；返回 (站点目录, 原始数据目录, 新建抓取器的函数)。"""
+    root, base_url = site
+    (root / "late.html").write_text(detail_page(), encoding='utf-8')
+    raw_path = tmp_path / "raw"
+    raw_path.mkdir()
+
+    def new_fetcher():
+        return http_fetcher.StaticFetcher(base_url, pool_size=2, min_interval=0, cache=HttpCache(str(tmp_path / "cache")))
+
+    downloaded, errors, _, _ = http_fetcher.fetch_new_months(new_fetcher(), str(raw_path), set(), [2024])
+    assert len(downloaded) == 3 and errors == []
+    return root, raw_path, new_fetcher
+
+def test_unchanged_site_is_not_downloaded_again(crawled):
+    _, raw_path, new_fetcher = crawled
+    assert not http_fetcher.probe_for_changes(new_fetcher(), [2024])
+    downloaded, errors, _, _ = http_fetcher.fetch_new_months(new_fetcher(), str(raw_path), set(os.listdir(raw_path)), [2024])
+    assert downloaded == [] and errors == []
+
+def test_revision_in_place_is_detected_and_redownloaded(crawled):
+    root, raw_path, new_fetcher = crawled
+    revise_page(root / "late.html", REVISED_ROWS)
+
+    # 与 crawler 中一样，探测和下载共用一个抓取器：探测时看到的变化不能被第二次条件请求掩盖
+    fetcher = new_fetcher()
+    assert http_fetcher.probe_for_changes(fetcher, [2024])
+    downloaded, errors, _, _ = http_fetcher.fetch_new_months(fetcher, str(raw_path), set(os.listdir(raw_path)), [2024])
+    assert [os.path.basename(path) for path in downloaded] == ["2024-03.csv"] and errors == []
+    df, _ = raw_parser.parse_raw_csv(downloaded[0])
+    assert df.set_index('地区').loc['全国', '出口'] == 502403
+
+def test_revisions_outside_the_window_are_not_rechecked(crawled, monkeypatch):
+    root, raw_path, new_fetcher = crawled
+    # 窗口只有最新的 1 个月 (3月)，1、2月的详情页不再复查
+    monkeypatch.setattr(http_fetcher, "REVISION_WINDOW_MONTHS", 1)
+    revise_page(root / "detail.html", REVISED_ROWS)
+
+    assert not http_fetcher.probe_for_changes(new_fetcher(), [2024])
+    downloaded, _, _, _ = http_fetcher.fetch_new_months(new_fetcher(), str(raw_path), set(os.listdir(raw_path)), [2024])
+    assert downloaded == []
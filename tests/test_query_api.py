@@ -0,0 +1,119 @@
+"""
+只读查询接口：在临时目录的存储上启动服务，用真实的 HTTP 请求检查各接口。
+"""
+import gzip
+import json
+import threading
+import urllib.error
+import urllib.request
+from urllib.parse import quote
+from http.server import ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pytest
+import data_store
+import derived_metrics
+import query_api
+
+def region_frames():
+    rng = np.random.default_rng(0)
+    months = pd.date_range("2023-01-01", "2025-06-01", freq="MS")
+    rows = [(region, month) for month in months for region in ('全国', '浙江省', '江苏省')]
+    master = pd.DataFrame(rows, columns=['地区', '时间'])
+    for flow in derived_metrics.FLOWS:
+        master[flow] = rng.uniform(1e5, 1e6, len(master)).round()
+    return derived_metrics.MetricCube.from_frame(master).region_frames()
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """在空的工作目录里启动服务，返回 get(path, headers) -> (状态码, 响应头, 响应体)。"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(query_api.QueryHandler, "cache", query_api.ResponseCache())
+    server = ThreadingHTTPServer(("127.0.0.1", 0), query_api.QueryHandler)
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def get(path, headers=None):
+        request = urllib.request.Request(base + quote(path, safe="/?=&,"), headers=headers or {})
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, response.headers, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, e.read()
+
+    yield get
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def published(api):
+    data_store.write_store(region_frames())
+    return api
+
+def test_empty_store_returns_503(api):
+    status, _, body = api("/regions")
+    assert status == 503 and "error" in json.loads(body)
+
+def test_regions_columns_and_unknown_route(published):
+    status, _, body = published("/regions")
+    assert status == 200 and json.loads(body)['regions'] == ['全国', '江苏省', '浙江省']
+    columns = json.loads(published("/columns")[2])['columns']
+    assert columns == derived_metrics.metric_columns()
+    assert published("/nope")[0] == 404
+
+def test_data_slices_time_range_and_columns(published):
+    status, _, body = published("/data?region=浙江省&columns=时间,进出口_当月,进出口_当月&start=2024-02&end=2024-04")
+    assert status == 200
+    region = json.loads(body)['regions']['浙江省']
+    assert list(region) == ['时间', '进出口_当月']
+    assert region['时间'] == ['2024-02', '2024-03', '2024-04']
+    expected = region_frames()['浙江省'].set_index('时间').loc['2024-02':'2024-04', '进出口_当月']
+    assert region['进出口_当月'] == expected.tolist()
+
+@pytest.mark.parametrize("query, status", [
+    ("/data", 400),
+    ("/data?region=火星", 404),
+    ("/data?region=全国&columns=不存在", 400),
+    ("/data?region=全国&start=2024/01", 400),
+    ("/data?region=全国&format=xml", 400),
+])
+def test_data_rejects_bad_queries(published, query, status):
+    code, _, body = published(query)
+    assert code == status and "error" in json.loads(body)
+
+def test_arrow_format(published):
+    status, headers, body = published("/data?region=全国,江苏省&columns=进口_当月同比&end=2023-03&format=arrow")
+    assert status == 200 and headers['Content-Type'] == query_api.ARROW_TYPE
+    table = ipc.open_stream(pa.py_buffer(body)).read_all()
+    assert table.column_names == ['地区', '时间', '进口_当月同比']
+    assert table.column('地区').to_pylist() == ['全国'] * 3 + ['江苏省'] * 3
+
+def test_etag_and_gzip(published):
+    status, headers, body = published("/data?region=全国", {'Accept-Encoding': 'gzip'})
+    assert status == 200 and headers['Content-Encoding'] == 'gzip'
+    payload = json.loads(gzip.decompress(body))
+    assert len(payload['regions']['全国']['时间']) == 30
+
+    status, _, body = published("/data?region=全国", {'If-None-Match': headers['ETag']})
+    assert status == 304 and body == b""
+
+def test_latest_and_data_agree_on_ratio_values(published):
+    latest = json.loads(published("/latest?region=江苏省")[2])['regions']['江苏省']
+    data = json.loads(published("/data?region=江苏省&start=2025-06")[2])['regions']['江苏省']
+    assert latest['时间'] == '2025-06'
+    for col in derived_metrics.metric_columns():
+        assert latest[col] == data[col][0], col
+    assert latest['进出口_当月同比_显示'].endswith('%')
+
+def test_unexpected_errors_return_generic_500(published, monkeypatch, capsys):
+    def broken(version, params):
+        raise RuntimeError("secret path /srv/data")
+
+    monkeypatch.setitem(query_api.ROUTES, '/version', broken)
+    status, _, body = published("/version")
+    assert status == 500
+    assert json.loads(body) == {'error': "服务器内部错误"}
+    # 异常详情只留在服务端
+    assert "secret path" in capsys.readouterr().err
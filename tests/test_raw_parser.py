@@ -0,0 +1,79 @@
+"""
+原始CSV解析：按表头标签定位列，表头不符时整份文件拒绝，有问题的行逐行报告原因。
+"""
+import pandas as pd
+import pytest
+import raw_parser
+
+# 海关表格的表头有三行；出口排在进口前面
+DETAIL_HEADER = [
+    ["单位：万元"] * 7,
+    ["收发货人所在地", "进出口", "进出口", "出口", "出口", "进口", "进口"],
+    ["收发货人所在地", "当月", "1至3月", "当月", "1至3月", "当月", "1至3月"],
+]
+DETAIL_ROWS = [
+    ["全国", "608169", "3009486", "502402", "1783422", "105767", "1226064"],
+    ["浙江省", "1130999", "3592920", "425726", "1390299", "705273", "2202621"],
+]
+
+def write_raw_csv(path, rows, header=DETAIL_HEADER):
+    lines = [",".join(row) for row in header + rows]
+    path.write_text("\n".join(lines) + "\n", encoding='utf-8-sig')
+    return str(path)
+
+def test_parse_raw_csv_maps_flows_by_label_and_rejects_rows(tmp_path):
+    rows = [
+        ["全国", "608169", "3009486", "502402", "1783422", "105767", "1226064"],
+        ["浙江省", "\"1,130,999\"", "3592920", "425726", "1390299", "705273", "2202621"],
+        ["江苏省", "12*", "3434945", "599510", "1728570", "769687", "1706375"],
+        ["", "100", "200", "60", "120", "40", "80"],
+        ["浙江省", "1", "2", "3", "4", "5", "6"],
+        ["", "", "", "", "", "", ""],
+        ["注：本表数据为初步统计", "", "", "", "", "", ""],
+    ]
+    file_path = write_raw_csv(tmp_path / "2024-03.csv", rows)
+
+    df, rejected = raw_parser.parse_raw_csv(file_path)
+
+    assert list(df.columns) == ['地区', '进出口', '进口', '出口', '进出口_年初至今', '进口_年初至今', '出口_年初至今', '时间']
+    values = df.set_index('地区')
+    assert list(values.index) == ['全国', '浙江省']
+    # 第 3 列是出口、第 5 列是进口，不能按位置对调
+    assert values.loc['全国', ['进出口', '出口', '进口']].tolist() == [608169, 502402, 105767]
+    assert values.loc['浙江省', ['进出口', '出口', '进口']].tolist() == [1130999, 425726, 705273]
+    # 累计值取海关公布的 (指标, 1至3月) 列
+    assert values.loc['全国', ['进出口_年初至今', '出口_年初至今', '进口_年初至今']].tolist() == [3009486, 1783422, 1226064]
+    assert (df['时间'] == pd.Timestamp("2024-03-01")).all()
+    # 行号从 1 开始，三行表头之后第一行数据是第 4 行；完全空白的行不报告
+    assert [(row['行号'], row['地区'], row['原因']) for row in rejected] == [
+        (6, '江苏省', "数值无法解析"),
+        (7, '', "缺少地区名称"),
+        (8, '浙江省', "地区重复"),
+        (10, '注：本表数据为初步统计', "没有数值"),
+    ]
+
+def test_parse_raw_csv_rejects_wrong_unit(tmp_path):
+    header = [["单位：亿元"] * 7] + DETAIL_HEADER[1:]
+    file_path = write_raw_csv(tmp_path / "2024-03.csv", DETAIL_ROWS, header=header)
+    with pytest.raises(raw_parser.RawSchemaError):
+        raw_parser.parse_raw_csv(file_path)
+
+def test_parse_raw_csv_cumulative_columns_are_optional(tmp_path):
+    # 1、2月合并发布的表格，累计列标成 '1-2月'
+    header = DETAIL_HEADER[:2] + [["收发货人所在地", "当月", "1-2月", "当月", "1-2月", "当月", "1-2月"]]
+    df, _ = raw_parser.parse_raw_csv(write_raw_csv(tmp_path / "2025-02.csv", DETAIL_ROWS, header=header))
+    assert df.set_index('地区').loc['浙江省', '进口_年初至今'] == 2202621
+
+    # 只有当月列的表格：累计列为空值，由派生指标退回到按当月值累加
+    header = [row[:1] + row[1::2] for row in DETAIL_HEADER]
+    rows = [row[:1] + row[1::2] for row in DETAIL_ROWS]
+    df, rejected = raw_parser.parse_raw_csv(write_raw_csv(tmp_path / "2024-03.csv", rows, header=header))
+    assert rejected == []
+    assert df.set_index('地区').loc['全国', ['进出口', '出口', '进口']].tolist() == [608169, 502402, 105767]
+    assert df[raw_parser.CUMULATIVE_COLUMNS].isna().all().all()
+
+def test_parse_raw_csv_rejects_ambiguous_cumulative_columns(tmp_path):
+    header = [row + [row[2]] for row in DETAIL_HEADER]
+    rows = [row + [row[2]] for row in DETAIL_ROWS]
+    with pytest.raises(raw_parser.RawSchemaError):
+        raw_parser.parse_raw_csv(write_raw_csv(tmp_path / "2024-03.csv", rows, header=header))
@@ -0,0 +1,57 @@
+"""
+跨进程刷新锁：按锁文件里的进程号判断是否过期，以及并发清理过期锁。
+"""
+import os
+import subprocess
+import sys
+import time
+import pytest
+import refresh_worker
+
+@pytest.fixture
+def lock_path(tmp_path):
+    return str(tmp_path / "refresh.lock")
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+def write_lock(path, content, age=0):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+
+def test_long_running_refresh_keeps_the_lock(lock_path):
+    # 持有者还活着：哪怕锁文件早已超过 stale_seconds 也不能被抢走
+    write_lock(lock_path, str(os.getpid()), age=10 * refresh_worker.LOCK_STALE_SECONDS)
+    assert refresh_worker.is_refresh_running(lock_path)
+    assert not refresh_worker.RefreshLock(lock_path).acquire()
+
+def test_lock_of_dead_process_is_taken_over(lock_path):
+    write_lock(lock_path, str(dead_pid()))
+    assert not refresh_worker.is_refresh_running(lock_path)
+    lock = refresh_worker.RefreshLock(lock_path)
+    assert lock.acquire()
+    assert refresh_worker.read_lock_pid(lock_path) == os.getpid()
+    lock.release()
+    assert not os.path.exists(lock_path)
+
+def test_lock_without_pid_falls_back_to_mtime(lock_path):
+    write_lock(lock_path, "")
+    assert refresh_worker.is_refresh_running(lock_path, stale_seconds=60)
+    write_lock(lock_path, "", age=120)
+    assert not refresh_worker.is_refresh_running(lock_path, stale_seconds=60)
+
+def test_stale_lock_removed_by_another_process(lock_path, monkeypatch):
+    write_lock(lock_path, str(dead_pid()))
+
+    def cleaned_up_elsewhere(path, stale_seconds):
+        # 判断过期之后、删除之前，另一个进程已经把过期锁删掉了
+        os.remove(path)
+        return False
+
+    monkeypatch.setattr(refresh_worker, "is_refresh_running", cleaned_up_elsewhere)
+    with refresh_worker.RefreshLock(lock_path) as acquired:
+        assert acquired
@@ -1,17 +1,18 @@
 import os
-import pandas as pd
 import streamlit as st
-from pyecharts import options as opts
-from pyecharts.charts import Line
-from streamlit_echarts import st_pyecharts
-import sys
-from datetime import datetime
+import chart_data
+import data_store
+import dashboard_views
+import perf_trace
+import region_catalog
 
 # --- 配置区 ---
 OUTPUT_FILENAME = "海关统计数据汇总.xlsx"
-TARGET_LOCATIONS = ['全国', '北京市', '上海市', '深圳市', '南京市', '合肥市', '浙江省']
-ZHEJIANG_CITIES = ['杭州市', '宁波市', '温州市', '湖州市', '金华市', '台州市']
-ALL_LOCATIONS = TARGET_LOCATIONS + ZHEJIANG_CITIES
+CATALOG = region_catalog.load_catalog()  # 概览地区、省份下属地市等配置见 regions.json
+TARGET_LOCATIONS = region_catalog.overview_regions(CATALOG)
+# 多地区对比可选的指标和口径，对应存储中的 '<指标><口径后缀>' 列
+COMPARE_FLOWS = ["进出口", "出口", "进口"]
+COMPARE_METRICS = {"当月": "_当月", "年初至今": "_年初至今", "同比": "_当月同比"}
 
 # =============================================================================
 #  Streamlit 应用主逻辑
@@ -111,40 +112,119 @@ st.markdown("""
 
 st.title("海关进出口数据看板")
 
-# 使用缓存来加载数据
-@st.cache_data
-def load_data():
-    if not os.path.exists(OUTPUT_FILENAME):
+# 使用缓存来加载数据，缓存以数据版本号为键：后台刷新发布新版本后自动失效
+# 用 cache_resource 而不是 cache_data：返回的按需访问器和其中的数据框由各会话共享，
+# 不会每次调用都反序列化出一份副本
+@st.cache_resource(max_entries=dashboard_views.DATA_CACHE_VERSIONS)
+def load_data(data_version):
+    if data_version is None:
         return None
     try:
-        xls = pd.ExcelFile(OUTPUT_FILENAME)
-        data_by_location = {sheet_name: xls.parse(sheet_name) for sheet_name in xls.sheet_names}
-        return data_by_location
+        # 不预先读取任何地区：概览卡片来自最新月份快照，地区数据在被选中时才读取
+        return data_store.RegionFrames(data_version)
     except Exception as e:
-        st.error(f"加载Excel文件失败: {e}")
+        st.error(f"加载数据失败: {e}")
         return None
 
-# --- 格式化函数 ---
-def format_delta_for_metric(yoy_value):
-    """将小数值格式化为带正负号的百分比字符串。"""
-    if pd.isna(yoy_value):
+# 最新月份快照：每个地区一行，数值和同比已在写入存储时格式化好
+@st.cache_data
+def load_snapshot(data_version):
+    if data_version is None:
+        return None
+    try:
+        return data_store.load_latest_snapshot(data_version)
+    except Exception as e:
+        st.error(f"加载最新数据快照失败: {e}")
         return None
-    return f"{yoy_value:+.2%}"
 
-def format_value(value):
-    """将数值格式化为带千位分隔符的字符串。"""
-    if pd.isna(value):
-        return "N/A"
-    return f"{value:,.0f}"
+# 当月走势图的配置字典：按 (数据版本, 地区, 时间窗口) 缓存，切换侧边栏时不再重建 pyecharts 对象
+@st.cache_data(max_entries=dashboard_views.CHART_CACHE_ENTRIES)
+def month_trend_options(data_version, location, start, end, _location_df):
+    # pyecharts 只在缓存未命中、真正构造图表时才导入
+    from pyecharts import options as opts
+    from pyecharts.charts import Line
+    x_data, y_data = dashboard_views.chart_series(data_version, location, ('进出口_当月', '进口_当月', '出口_当月'),
+                                                  start, end, _location_df)
+    line_chart_month = (
+        Line()
+        .add_xaxis(xaxis_data=x_data)
+        .add_yaxis(series_name="进出口(当月)", y_axis=y_data['进出口_当月'], label_opts=opts.LabelOpts(is_show=False))
+        .add_yaxis(series_name="进口(当月)", y_axis=y_data['进口_当月'], label_opts=opts.LabelOpts(is_show=False))
+        .add_yaxis(series_name="出口(当月)", y_axis=y_data['出口_当月'], label_opts=opts.LabelOpts(is_show=False))
+        .set_global_opts(
+            title_opts=opts.TitleOpts(title=f"{location} - 当月数据走势", pos_left='center', title_textstyle_opts=opts.TextStyleOpts(color="#111827")),
+            tooltip_opts=opts.TooltipOpts(trigger="axis"),
+            toolbox_opts=opts.ToolboxOpts(is_show=True),
+            xaxis_opts=opts.AxisOpts(type_="category", boundary_gap=False),
+            yaxis_opts=opts.AxisOpts(name="金额 (万元)"),
+            legend_opts=opts.LegendOpts(orient="horizontal", pos_top="40")
+        )
+    )
+    return dashboard_views.chart_options(line_chart_month)
+
+# 多地区对比图的配置字典：数据来自每个版本只构建一次的宽表，选多少个地区都只是列选择
+@st.cache_data(max_entries=dashboard_views.CHART_CACHE_ENTRIES)
+def comparison_chart_options(data_version, locations, column, title, _wide):
+    from pyecharts import options as opts
+    from pyecharts.charts import Line
+    matrix = _wide[column].reindex(columns=list(locations))
+    is_ratio = data_store.is_ratio_column(column)
+    if is_ratio:
+        matrix = (matrix * 100).round(2)
+    x_data, y_data = chart_data.decimate(matrix.index.strftime('%Y-%m').tolist(),
+                                         {location: matrix[location].to_numpy() for location in locations})
+    line_chart = Line().add_xaxis(xaxis_data=x_data)
+    for location in locations:
+        line_chart.add_yaxis(series_name=location, y_axis=y_data[location], label_opts=opts.LabelOpts(is_show=False))
+    line_chart.set_global_opts(
+        title_opts=opts.TitleOpts(title=title, pos_left='center', title_textstyle_opts=opts.TextStyleOpts(color="#111827")),
+        tooltip_opts=opts.TooltipOpts(trigger="axis"),
+        toolbox_opts=opts.ToolboxOpts(is_show=True),
+        xaxis_opts=opts.AxisOpts(type_="category", boundary_gap=False),
+        yaxis_opts=opts.AxisOpts(name="同比 (%)" if is_ratio else "金额 (万元)"),
+        legend_opts=opts.LegendOpts(orient="horizontal", pos_top="40", type_="scroll")
+    )
+    return dashboard_views.chart_options(line_chart)
+
+def show_comparison(data_version, locations, flow, metric, layout):
+    """多地区对比：叠加模式把所有地区画在一张图里，分图模式每个地区一张小图。"""
+    wide = dashboard_views.comparison_frame(data_version)
+    column = flow + COMPARE_METRICS[metric]
+    locations = tuple(loc for loc in locations if wide is not None and (column, loc) in wide.columns)
+    if not locations:
+        st.info("请在侧边栏选择至少一个有数据的地区。")
+        return
+    if layout == "叠加":
+        dashboard_views.show_chart(comparison_chart_options(data_version, locations, column, f"{flow} - {metric}", wide))
+        return
+    cols = st.columns(2)
+    for i, location in enumerate(locations):
+        with cols[i % 2]:
+            dashboard_views.show_chart(
+                comparison_chart_options(data_version, (location,), column, f"{location} {flow} - {metric}", wide),
+                height="320px")
+
+def current_data_version():
+    """读取数据版本号；首次运行时把现有的Excel汇总一次性导入列式存储，之后只读 Parquet。"""
+    if not data_store.store_exists() and os.path.exists(OUTPUT_FILENAME):
+        try:
+            data_store.import_workbook(OUTPUT_FILENAME)
+        except Exception as e:
+            st.error(f"导入Excel文件失败: {e}")
+    return data_store.read_version()
 
 # --- 数据加载及预处理 ---
-data = load_data()
+page_span = perf_trace.span("render.page")
+data_version = dashboard_views.pin_data_version(current_data_version())
+with perf_trace.span("render.load_data"):
+    data = load_data(data_version)
+    snapshot = load_snapshot(data_version)
+if data and snapshot is None:
+    # 旧版本的存储里没有快照文件，临时从完整数据计算一次
+    snapshot = data_store.build_latest_snapshot(data)
 latest_month_info = ""
-if data:
-    national_df = data.get('全国')
-    if national_df is not None and not national_df.empty:
-        latest_month = national_df['时间'].max()
-        latest_month_info = f"数据更新至: {latest_month}"
+if snapshot is not None and '全国' in snapshot.index:
+    latest_month_info = f"数据更新至: {snapshot.loc['全国', '时间_显示']}"
 
 
 # --- 侧边栏 ---
@@ -154,34 +234,50 @@ with st.sidebar:
     if latest_month_info:
         st.caption(latest_month_info)
     
+    st.header("查看模式")
+    view_mode = st.radio("查看模式", ["单个地区", "多地区对比"], horizontal=True, label_visibility="collapsed")
+
     st.header("地区筛选")
-    selected_location = st.selectbox(
-        "请选择要查看详情的地区：",
-        options=ALL_LOCATIONS,
-        index=ALL_LOCATIONS.index('浙江省') if '浙江省' in ALL_LOCATIONS else 0,
-        label_visibility="collapsed" # 隐藏默认标签，因为我们在上面有自己的标题
-    )
+    location_options = region_catalog.selectable_regions(CATALOG, dashboard_views.stored_regions(data_version))
+    if view_mode == "单个地区":
+        default_location = region_catalog.default_region(CATALOG)
+        selected_location = st.selectbox(
+            "请选择要查看详情的地区：",
+            options=location_options,
+            index=location_options.index(default_location) if default_location in location_options else 0,
+            label_visibility="collapsed" # 隐藏默认标签，因为我们在上面有自己的标题
+        )
+    else:
+        compare_locations = st.multiselect(
+            "请选择要对比的地区：",
+            options=location_options,
+            default=[loc for loc in TARGET_LOCATIONS if loc != '全国' and loc in location_options],
+        )
+        compare_flow = st.selectbox("指标", options=COMPARE_FLOWS)
+        compare_metric = st.radio("口径", options=list(COMPARE_METRICS), horizontal=True)
+        compare_layout = st.radio("图表布局", options=["叠加", "分图"], horizontal=True)
 
 # --- 主页面 ---
 if data:
     # --- 全国数据概览 ---
+    overview_span = perf_trace.span("render.overview")
     st.subheader("全国数据概览 (年初至今累计：万元)")
-    if national_df is not None and not national_df.empty:
-        latest_national_data = national_df.iloc[national_df['时间'].map(pd.to_datetime).idxmax()]
+    if '全国' in snapshot.index:
+        latest_national_data = snapshot.loc['全国']
         # 使用Streamlit原生带边框的容器来创建卡片
         with st.container(border=True):
             cols = st.columns(3)
             cols[0].metric(
-                label="进出口", value=format_value(latest_national_data['进出口_年初至今']),
-                delta=format_delta_for_metric(latest_national_data['进出口_年初至今同比']), delta_color="inverse"
+                label="进出口", value=latest_national_data['进出口_年初至今_显示'],
+                delta=latest_national_data['进出口_年初至今同比_显示'], delta_color="inverse"
             )
             cols[1].metric(
-                label="出口", value=format_value(latest_national_data['进口_年初至今']),
-                delta=format_delta_for_metric(latest_national_data['进口_年初至今同比']), delta_color="inverse"
+                label="出口", value=latest_national_data['出口_年初至今_显示'],
+                delta=latest_national_data['出口_年初至今同比_显示'], delta_color="inverse"
             )
             cols[2].metric(
-                label="进口", value=format_value(latest_national_data['出口_年初至今']),
-                delta=format_delta_for_metric(latest_national_data['出口_年初至今同比']), delta_color="inverse"
+                label="进口", value=latest_national_data['进口_年初至今_显示'],
+                delta=latest_national_data['进口_年初至今同比_显示'], delta_color="inverse"
             )
 
     # --- 业务地区数据概览 (每个地区一张卡片) ---
@@ -189,68 +285,61 @@ if data:
     locations_to_show = [loc for loc in TARGET_LOCATIONS if loc != '全国']
     
     for location in locations_to_show:
-        df = data.get(location)
-        if df is not None and not df.empty:
-            latest_data = df.iloc[df['时间'].map(pd.to_datetime).idxmax()]
+        if location in snapshot.index:
+            latest_data = snapshot.loc[location]
             
             # 每个地区使用一个独立的带边框容器
             with st.container(border=True):
                 st.subheader(location)
                 cols = st.columns(3)
-                cols[0].metric(label="进出口", value=format_value(latest_data['进出口_年初至今']), delta=format_delta_for_metric(latest_data['进出口_年初至今同比']), delta_color="inverse")
-                cols[1].metric(label="出口", value=format_value(latest_data['进口_年初至今']), delta=format_delta_for_metric(latest_data['进口_年初至今同比']), delta_color="inverse")
-                cols[2].metric(label="进口", value=format_value(latest_data['出口_年初至今']), delta=format_delta_for_metric(latest_data['出口_年初至今同比']), delta_color="inverse")
+                cols[0].metric(label="进出口", value=latest_data['进出口_年初至今_显示'], delta=latest_data['进出口_年初至今同比_显示'], delta_color="inverse")
+                cols[1].metric(label="出口", value=latest_data['出口_年初至今_显示'], delta=latest_data['出口_年初至今同比_显示'], delta_color="inverse")
+                cols[2].metric(label="进口", value=latest_data['进口_年初至今_显示'], delta=latest_data['进口_年初至今同比_显示'], delta_color="inverse")
                 
-                if location == '浙江省':
-                    with st.expander("展开/收起浙江省各地市数据"):
-                        for city_index, city in enumerate(ZHEJIANG_CITIES):
-                            city_df = data.get(city)
-                            if city_df is not None and not city_df.empty:
-                                latest_city_data = city_df.iloc[city_df['时间'].map(pd.to_datetime).idxmax()]
+                cities = region_catalog.sub_regions(CATALOG, location)
+                if cities:
+                    with st.expander(f"展开/收起{location}各地市数据"):
+                        for city_index, city in enumerate(cities):
+                            if city in snapshot.index:
+                                latest_city_data = snapshot.loc[city]
                                 st.markdown(f"**{city}**")
                                 city_cols = st.columns(3)
-                                city_cols[0].metric(label="进出口", value=format_value(latest_city_data['进出口_年初至今']), delta=format_delta_for_metric(latest_city_data['进出口_年初至今同比']), delta_color="inverse")
-                                city_cols[1].metric(label="出口", value=format_value(latest_city_data['进口_年初至今']), delta=format_delta_for_metric(latest_city_data['进口_年初至今同比']), delta_color="inverse")
-                                city_cols[2].metric(label="进口", value=format_value(latest_city_data['出口_年初至今']), delta=format_delta_for_metric(latest_city_data['出口_年初至今同比']), delta_color="inverse")
-                                if city_index < len(ZHEJIANG_CITIES) -1:
+                                city_cols[0].metric(label="进出口", value=latest_city_data['进出口_年初至今_显示'], delta=latest_city_data['进出口_年初至今同比_显示'], delta_color="inverse")
+                                city_cols[1].metric(label="出口", value=latest_city_data['出口_年初至今_显示'], delta=latest_city_data['出口_年初至今同比_显示'], delta_color="inverse")
+                                city_cols[2].metric(label="进口", value=latest_city_data['进口_年初至今_显示'], delta=latest_city_data['进口_年初至今同比_显示'], delta_color="inverse")
+                                if city_index < len(cities) -1:
                                     st.markdown("---")
+    overview_span.end()
     
+    # --- 多地区对比 ---
+    if view_mode == "多地区对比":
+        st.header(f"多地区对比 - {compare_flow}{compare_metric}")
+        with perf_trace.span("render.comparison"):
+            show_comparison(data_version, compare_locations, compare_flow, compare_metric, compare_layout)
+
     # --- 数据详情与图表 (分离) ---
-    st.header(f"{selected_location} - 数据详情")
+    else:
+        st.header(f"{selected_location} - 数据详情")
     
-    location_df = data.get(selected_location)
+        location_df = data.get(selected_location)
     
-    if location_df is not None and not location_df.empty:
-        # --- 图表部分 ---
-        st.subheader(f"当月数据走势图")
-        line_chart_month = (
-            Line()
-            .add_xaxis(xaxis_data=location_df['时间'].tolist())
-            .add_yaxis(series_name="进出口(当月)", y_axis=location_df['进出口_当月'].tolist(), label_opts=opts.LabelOpts(is_show=False))
-            .add_yaxis(series_name="进口(当月)", y_axis=location_df['进口_当月'].tolist(), label_opts=opts.LabelOpts(is_show=False))
-            .add_yaxis(series_name="出口(当月)", y_axis=location_df['出口_当月'].tolist(), label_opts=opts.LabelOpts(is_show=False))
-            .set_global_opts(
-                title_opts=opts.TitleOpts(title=f"{selected_location} - 当月数据走势", pos_left='center', title_textstyle_opts=opts.TextStyleOpts(color="#111827")),
-                tooltip_opts=opts.TooltipOpts(trigger="axis"),
-                toolbox_opts=opts.ToolboxOpts(is_show=True),
-                xaxis_opts=opts.AxisOpts(type_="category", boundary_gap=False),
-                yaxis_opts=opts.AxisOpts(name="金额 (万元)"),
-                legend_opts=opts.LegendOpts(orient="horizontal", pos_top="40")
-            )
-        )
-        st_pyecharts(line_chart_month, height="500px")
+        if location_df is not None and not location_df.empty:
+            # --- 图表部分 ---
+            st.subheader(f"当月数据走势图")
+            with perf_trace.span("render.trend_chart"):
+                start, end = dashboard_views.chart_range(data_version, selected_location, location_df)
+                dashboard_views.show_chart(month_trend_options(data_version, selected_location, start, end, location_df))
         
-        # --- 表格部分 ---
-        st.subheader("详细数据表")
-        st.caption("金额单位：万元")
-        display_df = location_df.copy()
-        for col in display_df.columns:
-            if '同比' in col:
-                display_df[col] = display_df[col].apply(lambda x: f"{x:.2%}" if pd.notna(x) else 'N/A')
-        st.dataframe(display_df.sort_values(by="时间", ascending=False), use_container_width=True, hide_index=True)
+            # --- 表格部分 ---
+            st.subheader("详细数据表")
+            st.caption("金额单位：万元")
+            with perf_trace.span("render.detail_table"):
+                dashboard_views.show_detail_table(data_version, selected_location, location_df)
 
-    else:
-        st.warning(f"未找到 '{selected_location}' 的数据。")
+        else:
+            st.warning(f"未找到 '{selected_location}' 的数据。")
 else:
     st.info("本地没有数据文件。请确保数据文件存在。")
 
+dashboard_views.show_performance_panel(page_span)
+